@@ -5,3 +5,14 @@ from . import report
 
 def _pre_init_clean_m2m_models(env):
     env.cr.execute("""DROP TABLE IF EXISTS account_journal_account_report_partner_ledger_rel""")
+
+
+def uninstall_hook(env):
+    # the daily balance triggers would otherwise outlive their table and
+    # break every write on the journal items
+    env.cr.execute("""
+        DROP TRIGGER IF EXISTS account_balance_daily_insert ON account_move_line;
+        DROP TRIGGER IF EXISTS account_balance_daily_update ON account_move_line;
+        DROP TRIGGER IF EXISTS account_balance_daily_delete ON account_move_line;
+        DROP FUNCTION IF EXISTS account_balance_daily_apply();
+    """)
@@ -17,10 +17,12 @@
     'data': [
         'security/ir.model.access.csv',
         'data/account_account_type.xml',
+        'data/partner_ledger_job_data.xml',
         'views/menu.xml',
         'views/ledger_menu.xml',
         'views/financial_report.xml',
         'views/settings.xml',
+        'views/partner_ledger_job_views.xml',
         'wizard/account_report_common_view.xml',
         'wizard/partner_ledger.xml',
         'wizard/general_ledger.xml',
@@ -41,5 +43,6 @@
         'report/report_journal_entries.xml',
     ],
     'pre_init_hook': '_pre_init_clean_m2m_models',
+    'uninstall_hook': 'uninstall_hook',
     'images': ['static/description/banner.gif'],
 }
@@ -1,3 +1,6 @@
 from . import account_account_type
 from . import account_financial_report
 from . import account_move_line
+from . import account_balance_daily
+from . import account_report_ledger
+from . import partner_ledger_job
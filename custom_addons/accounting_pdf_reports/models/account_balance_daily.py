@@ -0,0 +1,248 @@
+from odoo import api, models, fields
+
+
+class AccountBalanceDaily(models.Model):
+    """ Debit, credit and balance of the posted journal items, aggregated by
+        company, account, journal and date.
+
+        Statement level triggers on account_move_line apply the posted
+        amounts added or removed by each statement to the table as signed
+        deltas: items created on posted moves, moves posted, reset to draft
+        or cancelled, posted items changed or deleted. The trial balance and
+        the financial reports don't have to scan account_move_line. Draft
+        items can change at any time without going through a state
+        transition, they are always read from the journal items themselves.
+    """
+    _name = "account.balance.daily"
+    _description = "Daily Account Balance"
+    _log_access = False
+    _order = 'date, account_id'
+
+    company_id = fields.Many2one('res.company', 'Company', required=True, readonly=True, index=True)
+    company_currency_id = fields.Many2one(related='company_id.currency_id', string='Company Currency')
+    account_id = fields.Many2one('account.account', 'Account', required=True, readonly=True, ondelete='cascade')
+    journal_id = fields.Many2one('account.journal', 'Journal', required=True, readonly=True, ondelete='cascade')
+    date = fields.Date('Date', required=True, readonly=True)
+    debit = fields.Monetary('Debit', currency_field='company_currency_id', readonly=True)
+    credit = fields.Monetary('Credit', currency_field='company_currency_id', readonly=True)
+    balance = fields.Monetary('Balance', currency_field='company_currency_id', readonly=True)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(account_id, journal_id, date, company_id)',
+         'Only one daily balance per account, journal and date is allowed.'),
+    ]
+
+    # context keys of _query_get that need the journal items themselves
+    _unsupported_context_keys = (
+        'aged_balance', 'reconcile_date', 'account_tag_ids', 'analytic_tag_ids',
+        'analytic_account_ids', 'partner_ids', 'partner_categories',
+    )
+
+    def init(self):
+        self.env.cr.execute("""
+            -- the deltas are upserted, adding to the existing rows, so that
+            -- concurrent postings on the same key never insert it twice
+            CREATE OR REPLACE FUNCTION account_balance_daily_apply() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO account_balance_daily (company_id, account_id, journal_id, date, debit, credit, balance)
+                    SELECT company_id, account_id, journal_id, date, SUM(debit), SUM(credit), SUM(balance)
+                    FROM new_rows
+                    WHERE parent_state = 'posted' AND account_id IS NOT NULL
+                    GROUP BY company_id, account_id, journal_id, date
+                    ON CONFLICT (account_id, journal_id, date, company_id) DO UPDATE SET
+                        debit = account_balance_daily.debit + EXCLUDED.debit,
+                        credit = account_balance_daily.credit + EXCLUDED.credit,
+                        balance = account_balance_daily.balance + EXCLUDED.balance;
+                ELSIF TG_OP = 'DELETE' THEN
+                    INSERT INTO account_balance_daily (company_id, account_id, journal_id, date, debit, credit, balance)
+                    SELECT company_id, account_id, journal_id, date, -SUM(debit), -SUM(credit), -SUM(balance)
+                    FROM old_rows
+                    WHERE parent_state = 'posted' AND account_id IS NOT NULL
+                    GROUP BY company_id, account_id, journal_id, date
+                    ON CONFLICT (account_id, journal_id, date, company_id) DO UPDATE SET
+                        debit = account_balance_daily.debit + EXCLUDED.debit,
+                        credit = account_balance_daily.credit + EXCLUDED.credit,
+                        balance = account_balance_daily.balance + EXCLUDED.balance;
+                ELSE
+                    INSERT INTO account_balance_daily (company_id, account_id, journal_id, date, debit, credit, balance)
+                    SELECT company_id, account_id, journal_id, date, SUM(debit), SUM(credit), SUM(balance)
+                    FROM (
+                        SELECT n.company_id, n.account_id, n.journal_id, n.date, n.debit, n.credit, n.balance
+                        FROM old_rows o JOIN new_rows n ON (n.id = o.id)
+                        WHERE n.parent_state = 'posted' AND n.account_id IS NOT NULL
+                            AND (o.company_id, o.account_id, o.journal_id, o.date,
+                                 o.debit, o.credit, o.balance, o.parent_state)
+                                IS DISTINCT FROM
+                                (n.company_id, n.account_id, n.journal_id, n.date,
+                                 n.debit, n.credit, n.balance, n.parent_state)
+                        UNION ALL
+                        SELECT o.company_id, o.account_id, o.journal_id, o.date, -o.debit, -o.credit, -o.balance
+                        FROM old_rows o JOIN new_rows n ON (n.id = o.id)
+                        WHERE o.parent_state = 'posted' AND o.account_id IS NOT NULL
+                            AND (o.company_id, o.account_id, o.journal_id, o.date,
+                                 o.debit, o.credit, o.balance, o.parent_state)
+                                IS DISTINCT FROM
+                                (n.company_id, n.account_id, n.journal_id, n.date,
+                                 n.debit, n.credit, n.balance, n.parent_state)
+                    ) d
+                    GROUP BY company_id, account_id, journal_id, date
+                    HAVING SUM(debit) != 0 OR SUM(credit) != 0 OR SUM(balance) != 0
+                    ON CONFLICT (account_id, journal_id, date, company_id) DO UPDATE SET
+                        debit = account_balance_daily.debit + EXCLUDED.debit,
+                        credit = account_balance_daily.credit + EXCLUDED.credit,
+                        balance = account_balance_daily.balance + EXCLUDED.balance;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS account_balance_daily_insert ON account_move_line;
+            CREATE TRIGGER account_balance_daily_insert
+                AFTER INSERT ON account_move_line
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION account_balance_daily_apply();
+            DROP TRIGGER IF EXISTS account_balance_daily_update ON account_move_line;
+            CREATE TRIGGER account_balance_daily_update
+                AFTER UPDATE ON account_move_line
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION account_balance_daily_apply();
+            DROP TRIGGER IF EXISTS account_balance_daily_delete ON account_move_line;
+            CREATE TRIGGER account_balance_daily_delete
+                AFTER DELETE ON account_move_line
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION account_balance_daily_apply();
+        """)
+        self.env.cr.execute("SELECT 1 FROM account_balance_daily LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._rebuild()
+
+    def _insert_select(self, where_clause, params):
+        self.env.cr.execute("""
+            INSERT INTO account_balance_daily (company_id, account_id, journal_id, date, debit, credit, balance)
+            SELECT l.company_id, l.account_id, l.journal_id, l.date,
+                SUM(l.debit), SUM(l.credit), SUM(l.balance)
+            FROM account_move_line l
+            WHERE l.parent_state = 'posted'
+                AND l.account_id IS NOT NULL
+                AND """ + where_clause + """
+            GROUP BY l.company_id, l.account_id, l.journal_id, l.date
+        """, params)
+
+    @api.model
+    def _rebuild(self):
+        """ Recompute the whole table from the posted journal items. """
+        self.env['account.move.line'].flush_model()
+        self.env.cr.execute("DELETE FROM account_balance_daily")
+        self._insert_select('TRUE', ())
+        self.env.invalidate_all()
+
+    @api.model
+    def _get_where_clause(self):
+        """ Translate the report context understood by
+            ``account.move.line._query_get`` into a filter on the table
+            (aliased ``b``, joined with its account as ``acc``).
+
+            :returns: a tuple (where_clause, params), or None when the
+                context asks for filters the table can't answer
+        """
+        context = self.env.context
+        if context.get('account_balance_daily') is False:
+            return None
+        if any(context.get(key) for key in self._unsupported_context_keys):
+            return None
+        state = context.get('state')
+        if state and state.lower() not in ('all', 'posted'):
+            return None
+        if not self.env.su:
+            # the table only knows about companies, any other record rule on
+            # the journal items must be applied on the journal items
+            rule_domain = self.env['ir.rule']._compute_domain('account.move.line', 'read') or []
+            if any(isinstance(leaf, (list, tuple)) and leaf[0] != 'company_id' for leaf in rule_domain):
+                return None
+
+        wheres, params = [], []
+        if context.get('date_to'):
+            wheres.append("b.date <= %s")
+            params.append(context['date_to'])
+        if context.get('date_from'):
+            if not context.get('strict_range'):
+                wheres.append("(b.date >= %s OR acc.include_initial_balance)")
+            elif context.get('initial_bal'):
+                wheres.append("b.date < %s")
+            else:
+                wheres.append("b.date >= %s")
+            params.append(context['date_from'])
+        if context.get('journal_ids'):
+            wheres.append("b.journal_id IN %s")
+            params.append(tuple(context['journal_ids']))
+        if context.get('company_id'):
+            wheres.append("b.company_id = %s")
+            params.append(context['company_id'])
+        elif context.get('allowed_company_ids'):
+            wheres.append("b.company_id IN %s")
+            params.append(tuple(self.env.companies.ids))
+        else:
+            wheres.append("b.company_id = %s")
+            params.append(self.env.company.id)
+        if context.get('account_ids'):
+            wheres.append("b.account_id IN %s")
+            params.append(tuple(context['account_ids'].ids))
+        return " AND ".join(wheres), params
+
+    @api.model
+    def _get_raw_balances(self, account_ids):
+        """ Debit, credit and balance of the accounts computed from the
+            journal items matching the context.
+        """
+        tables, where_clause, where_params = self.env['account.move.line']._query_get()
+        tables = tables.replace('"', '') if tables else "account_move_line"
+        wheres = [""]
+        if where_clause.strip():
+            wheres.append(where_clause.strip())
+        filters = " AND ".join(wheres)
+        request = ("SELECT account_id AS id, COALESCE(SUM(debit), 0) AS debit, COALESCE(SUM(credit), 0) AS credit, "
+                   "COALESCE(SUM(debit), 0) - COALESCE(SUM(credit), 0) AS balance"
+                   " FROM " + tables + " WHERE account_id IN %s " + filters + " GROUP BY account_id")
+        self.env.cr.execute(request, (tuple(account_ids),) + tuple(where_params))
+        return {row.pop('id'): row for row in self.env.cr.dictfetchall()}
+
+    @api.model
+    def _get_account_balances(self, account_ids):
+        """ Debit, credit and balance of the accounts for the report context,
+            read from the daily balances when the context allows it.
+
+            :returns: a dictionary {account_id: {'debit', 'credit', 'balance'}}
+                for the accounts having items, or None when the context
+                filters can only be answered by the journal items
+        """
+        where = self._get_where_clause()
+        if where is None or not account_ids:
+            return None
+        self.env['account.move.line'].check_access('read')
+        # the triggers only see what has been written to the database
+        self.env['account.move.line'].flush_model([
+            'account_id', 'journal_id', 'date', 'company_id',
+            'debit', 'credit', 'balance', 'parent_state',
+        ])
+        where_clause, where_params = where
+        self.env.cr.execute("""
+            SELECT b.account_id AS id, COALESCE(SUM(b.debit), 0) AS debit,
+                COALESCE(SUM(b.credit), 0) AS credit, COALESCE(SUM(b.balance), 0) AS balance
+            FROM account_balance_daily b
+            JOIN account_account acc ON (acc.id = b.account_id)
+            WHERE b.account_id IN %s AND """ + where_clause + """
+            GROUP BY b.account_id
+        """, [tuple(account_ids)] + where_params)
+        res = {row.pop('id'): row for row in self.env.cr.dictfetchall()}
+
+        state = self.env.context.get('state')
+        if not state or state.lower() == 'all':
+            drafts = self.with_context(state='draft')._get_raw_balances(account_ids)
+            for account_id, values in drafts.items():
+                if account_id not in res:
+                    res[account_id] = values
+                    continue
+                for field in ('debit', 'credit', 'balance'):
+                    res[account_id][field] += values[field]
+        return res
@@ -6,6 +6,14 @@ from odoo import api, models, fields
 class AccountMoveLine(models.Model):
     _inherit = "account.move.line"
 
+    # context keys read by _compile_query_get
+    _query_get_context_keys = (
+        'aged_balance', 'date_from', 'date_to', 'strict_range', 'initial_bal',
+        'journal_ids', 'state', 'company_id', 'allowed_company_ids',
+        'reconcile_date', 'account_tag_ids', 'account_ids', 'analytic_tag_ids',
+        'analytic_account_ids', 'partner_ids', 'partner_categories', 'active_test',
+    )
+
     @api.model
     def _where_calc(self, domain, active_test=True):
         """Computes the WHERE clause needed to implement an OpenERP domain.
@@ -45,14 +53,54 @@ class AccountMoveLine(models.Model):
         if domain:
             expression.expression(domain, self.sudo(), self._table, query)
 
+    @api.model
+    def _query_get_signature(self, domain=None):
+        """ Normalized key of everything the result of :meth:`_query_get`
+            depends on: the domain, the report filters of the context, the
+            companies and the user whose record rules are applied.
+        """
+        def normalize(value):
+            if isinstance(value, models.BaseModel):
+                value = value.ids
+            if isinstance(value, (list, tuple, set)):
+                return tuple(sorted(value))
+            return value
+
+        context = self.env.context
+        return (
+            repr(domain),
+            tuple((key, normalize(context.get(key))) for key in self._query_get_context_keys),
+            self.env.uid,
+            self.env.su,
+            self.env.company.id,
+            tuple(self.env.companies.ids),
+        )
+
     @api.model
     def _query_get(self, domain=None):
+        """ Return the (tables, where_clause, where_params) filtering the
+            journal items on the report filters found in the context.
+
+            The compiled fragments are cached on the cursor for the duration
+            of the request, keyed by :meth:`_query_get_signature`, so that
+            reports calling this once per partner or per journal only compile
+            the domain and the record rules once.
+        """
         self.check_access('read')
+        cache = self.env.cr.cache.setdefault('account_move_line_query_get', {})
+        signature = self._query_get_signature(domain)
+        if signature not in cache:
+            cache[signature] = self._compile_query_get(domain)
+        tables, where_clause, where_clause_params = cache[signature]
+        return tables, where_clause, list(where_clause_params)
 
+    @api.model
+    def _compile_query_get(self, domain=None):
         context = dict(self.env.context or {})
         domain = domain or []
         if not isinstance(domain, (list, tuple)):
             domain = ast.literal_eval(domain)
+        domain = list(domain)
 
         date_field = 'date'
         if context.get('aged_balance'):
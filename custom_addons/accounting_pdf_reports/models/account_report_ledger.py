@@ -0,0 +1,195 @@
+import uuid
+from odoo import api, models
+
+
+class AccountReportLedger(models.AbstractModel):
+    """ Ledger engine shared by the general ledger and the reports listing
+        the move lines of a set of accounts (bank book, cash book...).
+    """
+    _name = "account.report.ledger"
+    _description = "Account Ledger Engine"
+
+    # number of move lines fetched at once from the server-side cursor
+    _ledger_fetch_size = 2000
+
+    @api.model
+    def _get_ledger_entries(self, accounts, init_balance, sortby, display_account,
+                            analytic_account_ids=False, partner_ids=False):
+        """
+        :param:
+                accounts: the recordset of accounts
+                init_balance: boolean value of initial_balance
+                sortby: sorting by date or partner and journal
+                display_account: type of account(receivable, payable and both)
+                analytic_account_ids: the recordset of analytic accounts
+                partner_ids: the recordset of partners
+
+        Returns a list of dictionaries, one per account, with following key and value {
+                'code': account code,
+                'name': account name,
+                'debit': sum of total debit amount,
+                'credit': sum of total credit amount,
+                'balance': total balance,
+                'move_lines': list of move line
+        }
+        """
+        return list(self._iter_ledger_entries(
+            accounts, init_balance, sortby, display_account,
+            analytic_account_ids=analytic_account_ids, partner_ids=partner_ids))
+
+    @api.model
+    def _iter_ledger_entries(self, accounts, init_balance, sortby, display_account,
+                             analytic_account_ids=False, partner_ids=False):
+        """ Generator version of :meth:`_get_ledger_entries`, yielding the
+            accounts one by one in the order of ``accounts``.
+
+            Running balances are computed by the database with a window
+            function and the move lines are read through a server-side
+            cursor, ``_ledger_fetch_size`` rows at a time, so that only the
+            lines of the account being rendered are kept in memory.
+        """
+        cr = self.env.cr
+        MoveLine = self.env['account.move.line']
+        initial_lines = {}
+
+        # Prepare initial sql query and Get the initial move lines
+        if init_balance:
+            context = dict(self.env.context)
+            context['date_from'] = self.env.context.get('date_from')
+            context['date_to'] = False
+            context['initial_bal'] = True
+            if analytic_account_ids:
+                context['analytic_account_ids'] = analytic_account_ids
+            if partner_ids:
+                context['partner_ids'] = partner_ids
+            init_tables, init_where_clause, init_where_params = MoveLine.with_context(context)._query_get()
+            init_wheres = [""]
+            if init_where_clause.strip():
+                init_wheres.append(init_where_clause.strip())
+            init_filters = " AND ".join(init_wheres)
+            filters = init_filters.replace('account_move_line__move_id', 'm').replace('account_move_line', 'l')
+            sql = ("""SELECT 0 AS lid, l.account_id AS account_id, '' AS ldate,
+                '' AS lcode, 0.0 AS amount_currency,
+                '' AS analytic_account_id, '' AS lref,
+                'Initial Balance' AS lname, COALESCE(SUM(l.debit),0.0) AS debit,
+                COALESCE(SUM(l.credit),0.0) AS credit,
+                COALESCE(SUM(l.debit),0) - COALESCE(SUM(l.credit), 0) as balance,
+                '' AS lpartner_id,\
+                '' AS move_name, '' AS move_id, '' AS currency_code,\
+                NULL AS currency_id,\
+                '' AS invoice_id, '' AS invoice_type, '' AS invoice_number,\
+                '' AS partner_name\
+                FROM account_move_line l\
+                LEFT JOIN account_move m ON (l.move_id=m.id)\
+                LEFT JOIN res_currency c ON (l.currency_id=c.id)\
+                LEFT JOIN res_partner p ON (l.partner_id=p.id)\
+                JOIN account_journal j ON (l.journal_id=j.id)\
+                WHERE l.account_id IN %s""" + filters + ' GROUP BY l.account_id')
+            params = (tuple(accounts.ids),) + tuple(init_where_params)
+            cr.execute(sql, params)
+            for row in cr.dictfetchall():
+                initial_lines[row.pop('account_id')] = row
+
+        sql_sort = 'l.date, l.move_id'
+        if sortby == 'sort_journal_partner':
+            sql_sort = 'j.code, p.name, l.move_id'
+
+        # Prepare sql query base on selected parameters from wizard
+        context = dict(self.env.context)
+        if analytic_account_ids:
+            context['analytic_account_ids'] = analytic_account_ids
+        if partner_ids:
+            context['partner_ids'] = partner_ids
+        tables, where_clause, where_params = MoveLine.with_context(context)._query_get()
+        wheres = [""]
+        if where_clause.strip():
+            wheres.append(where_clause.strip())
+        filters = " AND ".join(wheres)
+        filters = filters.replace('account_move_line__move_id', 'm').replace('account_move_line', 'l')
+
+        # Declare a cursor on the move lines, ordered like ``accounts`` and
+        # carrying the running balance of their account (the initial balance
+        # is added while fetching)
+        cursor_name = 'account_ledger_%s' % uuid.uuid4().hex
+        sql = ('DECLARE ' + cursor_name + ''' NO SCROLL CURSOR FOR
+            SELECT l.id AS lid, l.account_id AS account_id,
+            l.date AS ldate, j.code AS lcode, l.currency_id,
+            l.amount_currency, '' AS analytic_account_id,
+            l.ref AS lref, l.name AS lname, COALESCE(l.debit,0) AS debit,
+            COALESCE(l.credit,0) AS credit,
+            SUM(COALESCE(l.debit,0) - COALESCE(l.credit,0)) OVER (
+                PARTITION BY l.account_id ORDER BY ''' + sql_sort + ''', l.id
+                ROWS UNBOUNDED PRECEDING) AS balance,
+            m.name AS move_name, c.symbol AS currency_code,
+            p.name AS partner_name
+            FROM account_move_line l
+            JOIN account_move m ON (l.move_id=m.id)
+            LEFT JOIN res_currency c ON (l.currency_id=c.id)
+            LEFT JOIN res_partner p ON (l.partner_id=p.id)
+            JOIN account_journal j ON (l.journal_id=j.id)
+            JOIN unnest(%s::int[]) WITH ORDINALITY AS acc(id, seq) ON (l.account_id = acc.id)
+            WHERE l.account_id IN %s ''' + filters + '''
+            ORDER BY acc.seq, ''' + sql_sort + ', l.id')
+        params = (accounts.ids, tuple(accounts.ids)) + tuple(where_params)
+        cr.execute(sql, params)
+
+        def fetch_rows():
+            while True:
+                cr.execute('FETCH FORWARD %s FROM ' + cursor_name, (self._ledger_fetch_size,))
+                rows = cr.dictfetchall()
+                if not rows:
+                    break
+                yield from rows
+            # a generator dropped before the end leaves the cursor open
+            # until the end of the transaction
+            cr.execute('CLOSE ' + cursor_name)
+
+        rows = fetch_rows()
+        row = next(rows, None)
+        for account in accounts:
+            move_lines = []
+            opening_balance = 0.0
+            if account.id in initial_lines:
+                move_lines.append(initial_lines[account.id])
+                opening_balance = initial_lines[account.id]['balance']
+            while row is not None and row['account_id'] == account.id:
+                row.pop('account_id')
+                row['balance'] += opening_balance
+                move_lines.append(row)
+                row = next(rows, None)
+
+            # Calculate the debit, credit and balance for Accounts
+            currency = account.currency_id and account.currency_id or self.env.company.currency_id
+            res = dict((fn, 0.0) for fn in ['credit', 'debit', 'balance'])
+            res['code'] = account.code
+            res['name'] = account.name
+            res['move_lines'] = move_lines
+            for line in move_lines:
+                res['debit'] += line['debit']
+                res['credit'] += line['credit']
+            if move_lines:
+                res['balance'] = move_lines[-1]['balance']
+            if display_account == 'all':
+                yield res
+            if display_account == 'movement' and res.get('move_lines'):
+                yield res
+            if display_account == 'not_zero' and not currency.is_zero(res['balance']):
+                yield res
+
+    @api.model
+    def _get_journal_payment_accounts(self, journal_type):
+        """ Accounts of the payment methods of the active journals of type
+            ``journal_type`` ('bank' or 'cash') of the current companies.
+        """
+        self.env['account.payment.method.line'].flush_model(['journal_id', 'payment_account_id'])
+        self.env['account.journal'].flush_model(['type', 'active', 'company_id'])
+        self.env.cr.execute("""
+            SELECT pml.payment_account_id
+            FROM account_payment_method_line pml
+            JOIN account_journal j ON (j.id = pml.journal_id)
+            JOIN account_account acc ON (acc.id = pml.payment_account_id)
+            WHERE j.type = %s AND j.active AND j.company_id IN %s
+            GROUP BY pml.payment_account_id, acc.code
+            ORDER BY acc.code, pml.payment_account_id
+        """, (journal_type, tuple(self.env.companies.ids)))
+        return self.env['account.account'].browse([row[0] for row in self.env.cr.fetchall()])
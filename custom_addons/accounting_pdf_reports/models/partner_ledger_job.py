@@ -0,0 +1,120 @@
+import json
+import logging
+
+from odoo import api, fields, models, _
+from odoo.tools import date_utils
+
+_logger = logging.getLogger(__name__)
+
+
+class AccountReportPartnerLedgerJob(models.Model):
+    """ Partner ledger too large to be printed within a request.
+
+        The wizard records the report data and the sorted partners to print;
+        their ledger is rendered by a cron job, ``_pdf_chunk_size`` partners
+        at a time, as one PDF attached to this record per chunk. The record
+        keeps track of the progress.
+    """
+    _name = 'account.report.partner.ledger.job'
+    _description = 'Partner Ledger Printing'
+    _order = 'id desc'
+
+    name = fields.Char('Name', required=True, readonly=True)
+    company_id = fields.Many2one('res.company', 'Company', required=True, readonly=True,
+                                 default=lambda self: self.env.company)
+    user_id = fields.Many2one('res.users', 'Printed By', required=True, readonly=True,
+                              default=lambda self: self.env.user)
+    state = fields.Selection([('queued', 'Queued'),
+                              ('in_progress', 'In Progress'),
+                              ('done', 'Done'),
+                              ('failed', 'Failed')], string='Status',
+                             required=True, readonly=True, default='queued')
+    report_data = fields.Json('Report Data', readonly=True)
+    partner_ids = fields.Json('Partners to Print', readonly=True)
+    partner_count = fields.Integer('Partners', readonly=True)
+    processed_count = fields.Integer('Printed Partners', readonly=True)
+    progress = fields.Float('Progress', compute='_compute_progress')
+    error_message = fields.Text('Error', readonly=True)
+    attachment_ids = fields.One2many('ir.attachment', 'res_id', string='PDF Files', readonly=True,
+                                     domain=[('res_model', '=', 'account.report.partner.ledger.job')])
+
+    # number of partners printed in one PDF file
+    _pdf_chunk_size = 2000
+
+    @api.depends('partner_count', 'processed_count')
+    def _compute_progress(self):
+        for job in self:
+            job.progress = job.partner_count and \
+                100.0 * job.processed_count / job.partner_count
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            # the report data holds dates, stored as the client would send them
+            if vals.get('report_data'):
+                vals['report_data'] = json.loads(json.dumps(vals['report_data'],
+                                                            default=date_utils.json_default))
+            vals.setdefault('partner_count', len(vals.get('partner_ids') or []))
+        jobs = super().create(vals_list)
+        self.env.ref('accounting_pdf_reports.ir_cron_partner_ledger_job')._trigger()
+        return jobs
+
+    def _process_chunk(self):
+        """ Render the ledger of the next chunk of partners as the user who
+            printed it, and attach the PDF to the job.
+        """
+        self.ensure_one()
+        report = self.env.ref('accounting_pdf_reports.action_report_partnerledger')
+        start = self.processed_count
+        chunk_ids = self.partner_ids[start:start + self._pdf_chunk_size]
+        data = dict(self.report_data, form=dict(self.report_data['form'], partner_ids=chunk_ids))
+        pdf_content, dummy = self.env['ir.actions.report'].with_user(self.user_id).with_company(
+            self.company_id).with_context(landscape=True)._render_qweb_pdf(report, data=data)
+        self.env['ir.attachment'].create({
+            'name': _('Partner Ledger %(first)s-%(last)s.pdf',
+                      first=start + 1, last=start + len(chunk_ids)),
+            'type': 'binary',
+            'raw': pdf_content,
+            'mimetype': 'application/pdf',
+            'res_model': self._name,
+            'res_id': self.id,
+        })
+        processed_count = start + len(chunk_ids)
+        self.write({
+            'processed_count': processed_count,
+            'state': 'done' if processed_count >= self.partner_count else 'in_progress',
+        })
+
+    def _process(self):
+        """ Print the remaining partners of the jobs. With the context key
+            'partner_ledger_job_commit' {Boolean} every chunk is committed,
+            so that an interrupted run resumes with the partners not yet
+            printed, and a job whose chunk fails is marked as failed instead
+            of blocking the next ones.
+        """
+        commit = self.env.context.get('partner_ledger_job_commit')
+        for job in self:
+            while job.state in ('queued', 'in_progress'):
+                if not commit:
+                    job._process_chunk()
+                    continue
+                try:
+                    with self.env.cr.savepoint():
+                        job._process_chunk()
+                except Exception as e:
+                    _logger.exception("Printing of the partner ledger %s failed", job.name)
+                    job.write({'state': 'failed', 'error_message': str(e)})
+                self.env.cr.commit()
+
+    @api.model
+    def _cron_process_jobs(self):
+        self.search([('state', 'in', ('queued', 'in_progress'))], order='id').with_context(
+            partner_ledger_job_commit=True)._process()
+
+    def action_process(self):
+        """ Queue the failed jobs again, resuming with the partners not yet printed,
+            and wake up the cron job processing them.
+        """
+        self.filtered(lambda job: job.state == 'failed').write({'state': 'queued', 'error_message': False})
+        self.env.ref('accounting_pdf_reports.ir_cron_partner_ledger_job')._trigger()
+        return True
@@ -19,7 +19,10 @@ class ReportFinancial(models.AbstractModel):
         res = {}
         for account in accounts:
             res[account.id] = dict.fromkeys(mapping, 0.0)
-        if accounts:
+        balances = self.env['account.balance.daily']._get_account_balances(accounts.ids)
+        if balances is not None:
+            res.update(balances)
+        elif accounts:
             tables, where_clause, where_params = self.env['account.move.line']._query_get()
             tables = tables.replace('"', '') if tables else "account_move_line"
             wheres = [""]
@@ -37,58 +40,98 @@ class ReportFinancial(models.AbstractModel):
                 res[row['id']] = row
         return res
 
-    def _compute_report_balance(self, reports):
-        '''returns a dictionary with key=the ID of a record and value=the credit, debit and balance amount
-           computed for this record. If the record is of type :
-               'accounts' : it's the sum of the linked accounts
-               'account_type' : it's the sum of leaf accoutns with such an account_type
-               'account_report' : it's the amount of the related report
-               'sum' : it's the sum of the children of this record (aka a 'view' record)'''
-        res = {}
-        fields = ['credit', 'debit', 'balance']
-        for report in reports:
-            if report.id in res:
-                continue
-            res[report.id] = dict((fn, 0.0) for fn in fields)
+    def _get_report_accounts(self, reports):
+        """ returns a dictionary with key=the ID of every record reachable from
+            ``reports`` (through their children and linked reports) and
+            value=the accounts it directly aggregates, if any. All the
+            'account_type' records are resolved with a single search.
+        """
+        nodes = self.env['account.financial.report']
+        to_visit = reports
+        while to_visit:
+            nodes |= to_visit
+            to_visit = (to_visit.children_ids | to_visit.account_report_id) - nodes
+        type_nodes = nodes.filtered(lambda report: report.type == 'account_type')
+        accounts_by_type = {}
+        if type_nodes:
+            for account in self.env['account.account'].search(
+                    [('account_type', 'in', type_nodes.account_type_ids.mapped('type'))]):
+                accounts_by_type.setdefault(account.account_type, []).append(account.id)
+        report_accounts = {}
+        for report in nodes:
             if report.type == 'accounts':
-                # it's the sum of the linked accounts
-                res[report.id]['account'] = self._compute_account_balance(report.account_ids)
-                for value in res[report.id]['account'].values():
-                    for field in fields:
-                        res[report.id][field] += value.get(field)
+                report_accounts[report.id] = report.account_ids
             elif report.type == 'account_type':
-                # it's the sum the leaf accounts with such an account type
-                accounts = self.env['account.account'].search(
-                    [('account_type', 'in', report.account_type_ids.mapped('type'))])
+                report_accounts[report.id] = self.env['account.account'].browse([
+                    account_id for account_type in report.account_type_ids.mapped('type')
+                    for account_id in accounts_by_type.get(account_type, [])])
+        return report_accounts
+
+    def _compute_report_balance(self, reports, report_accounts=None):
+        '''returns a dictionary with key=the ID of a record and value=the credit, debit and balance amount
+           computed for this record. If the record is of type :
+               'accounts' : it's the sum of the linked accounts
+               'account_type' : it's the sum of leaf accoutns with such an account_type
+               'account_report' : it's the amount of the related report
+               'sum' : it's the sum of the children of this record (aka a 'view' record)
+
+           The accounts of the whole tree are aggregated with a single query, then every record
+           is resolved once, bottom-up, from a memo table. ``report_accounts`` is the result of
+           :meth:`_get_report_accounts`, it can be given to evaluate the same tree on several
+           periods.'''
+        fields = ['credit', 'debit', 'balance']
+        if report_accounts is None:
+            report_accounts = self._get_report_accounts(reports)
+        all_accounts = self.env['account.account']
+        for accounts in report_accounts.values():
+            all_accounts |= accounts
+        account_balances = self._compute_account_balance(all_accounts)
+
+        memo = {}
 
-                res[report.id]['account'] = self._compute_account_balance(accounts)
-                for value in res[report.id]['account'].values():
+        def evaluate(report):
+            if report.id in memo:
+                return memo[report.id]
+            # a record referencing itself counts for 0 instead of looping
+            memo[report.id] = dict((fn, 0.0) for fn in fields)
+            res = dict((fn, 0.0) for fn in fields)
+            if report.type in ('accounts', 'account_type'):
+                # it's the sum of the linked accounts or of the leaf accounts with such an account type
+                res['account'] = {
+                    account_id: dict(account_balances[account_id])
+                    for account_id in report_accounts[report.id].ids
+                }
+                for value in res['account'].values():
                     for field in fields:
-                        res[report.id][field] += value.get(field)
+                        res[field] += value.get(field)
             elif report.type == 'account_report' and report.account_report_id:
                 # it's the amount of the linked report
-                res2 = self._compute_report_balance(report.account_report_id)
-                for key, value in res2.items():
-                    for field in fields:
-                        res[report.id][field] += value[field]
+                value = evaluate(report.account_report_id)
+                for field in fields:
+                    res[field] += value[field]
             elif report.type == 'sum':
                 # it's the sum of the children of this account.report
-                res2 = self._compute_report_balance(report.children_ids)
-                for key, value in res2.items():
+                for child in report.children_ids:
+                    value = evaluate(child)
                     for field in fields:
-                        res[report.id][field] += value[field]
-        return res
+                        res[field] += value[field]
+            memo[report.id] = res
+            return res
+
+        return {report.id: evaluate(report) for report in reports}
 
     def get_account_lines(self, data):
         lines = []
         account_report = self.env['account.financial.report'].search(
             [('id', '=', data['account_report_id'][0])])
         child_reports = account_report._get_children_by_order()
-        res = self.with_context(data.get('used_context'))._compute_report_balance(child_reports)
+        report_accounts = self._get_report_accounts(child_reports)
+        res = self.with_context(data.get('used_context'))._compute_report_balance(
+            child_reports, report_accounts)
         if data['enable_filter']:
             comparison_res = self.with_context(
                 data.get('comparison_context'))._compute_report_balance(
-                child_reports)
+                child_reports, report_accounts)
             for report_id, value in comparison_res.items():
                 res[report_id]['comp_bal'] = value['balance']
                 report_acc = res[report_id].get('account')
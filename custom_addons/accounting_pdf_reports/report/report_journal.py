@@ -90,6 +90,80 @@ class ReportJournal(models.AbstractModel):
                 res[tax]['tax_amount'] = res[tax]['tax_amount'] * -1
         return res
 
+    def _get_journal_data(self, data, journal_ids):
+        """ Compute the lines, the debit and credit totals and the tax
+            declaration of all the journals with a fixed number of grouped
+            queries, whatever the number of journals and taxes.
+
+            :returns: a tuple (lines, totals, taxes) of dictionaries keyed by
+                journal id: the move lines (sharing a single prefetch set),
+                ``{'debit': ..., 'credit': ...}`` and the same
+                ``{tax: {'base_amount': ..., 'tax_amount': ...}}`` mapping as
+                :meth:`_get_taxes`
+        """
+        move_state = ['draft', 'posted']
+        if data['form'].get('target_move', 'all') == 'posted':
+            move_state = ['posted']
+        sort_selection = data['form'].get('sort_selection', 'date')
+        journals = self.env['account.journal'].browse(journal_ids)
+        lines = {journal_id: [] for journal_id in journal_ids}
+        totals = {journal_id: {'debit': 0.0, 'credit': 0.0} for journal_id in journal_ids}
+        taxes = {journal_id: {} for journal_id in journal_ids}
+        if not journal_ids:
+            return lines, totals, taxes
+
+        query_get_clause = self._get_query_get_clause(data)
+        params = [tuple(move_state), tuple(journal_ids)] + query_get_clause[2]
+        query = 'SELECT "account_move_line".id, "account_move_line".journal_id FROM ' + query_get_clause[0] + ', account_move am, account_account acc WHERE "account_move_line".account_id = acc.id AND "account_move_line".move_id=am.id AND am.state IN %s AND "account_move_line".journal_id IN %s AND ' + query_get_clause[1] + ' ORDER BY "account_move_line".journal_id, '
+        if sort_selection == 'date':
+            query += '"account_move_line".date'
+        else:
+            query += 'am.name'
+        query += ', "account_move_line".move_id'
+        self.env.cr.execute(query, tuple(params))
+        all_ids = []
+        for line_id, journal_id in self.env.cr.fetchall():
+            all_ids.append(line_id)
+            lines[journal_id].append(line_id)
+        MoveLine = self.env['account.move.line']
+        lines = {journal_id: MoveLine.browse(ids).with_prefetch(all_ids) for journal_id, ids in lines.items()}
+
+        self.env.cr.execute('SELECT "account_move_line".journal_id, SUM(debit), SUM(credit) FROM ' + query_get_clause[0] + ', account_move am '
+                            'WHERE "account_move_line".move_id=am.id AND am.state IN %s AND "account_move_line".journal_id IN %s AND ' + query_get_clause[1] +
+                            ' GROUP BY "account_move_line".journal_id',
+                            tuple(params))
+        for journal_id, debit, credit in self.env.cr.fetchall():
+            totals[journal_id] = {'debit': debit or 0.0, 'credit': credit or 0.0}
+
+        query = """
+            SELECT "account_move_line".journal_id, rel.account_tax_id, SUM("account_move_line".balance) AS base_amount
+            FROM account_move_line_account_tax_rel rel, """ + query_get_clause[0] + """
+            LEFT JOIN account_move am ON "account_move_line".move_id = am.id
+            WHERE "account_move_line".id = rel.account_move_line_id
+                AND am.state IN %s
+                AND "account_move_line".journal_id IN %s
+                AND """ + query_get_clause[1] + """
+           GROUP BY "account_move_line".journal_id, rel.account_tax_id"""
+        self.env.cr.execute(query, tuple(params))
+        base_amounts = self.env.cr.fetchall()
+        self.env.cr.execute('SELECT "account_move_line".journal_id, tax_line_id, sum(debit - credit) FROM ' + query_get_clause[0] + ', account_move am '
+                            'WHERE "account_move_line".move_id=am.id AND am.state IN %s AND "account_move_line".journal_id IN %s AND ' + query_get_clause[1] +
+                            ' AND tax_line_id IS NOT NULL GROUP BY "account_move_line".journal_id, tax_line_id',
+                            tuple(params))
+        tax_amounts = {(journal_id, tax_id): amount for journal_id, tax_id, amount in self.env.cr.fetchall()}
+
+        journal_types = {journal.id: journal.type for journal in journals}
+        tax_ids = [tax_id for dummy, tax_id, dummy in base_amounts]
+        for journal_id, tax_id, base_amount in base_amounts:
+            #sales operation are credits
+            sign = -1 if journal_types[journal_id] == 'sale' else 1
+            tax = self.env['account.tax'].browse(tax_id).with_prefetch(tax_ids)
+            taxes[journal_id][tax] = {
+                'base_amount': base_amount * sign,
+                'tax_amount': (tax_amounts.get((journal_id, tax_id)) or 0.0) * sign,
+            }
+        return lines, totals, taxes
+
     def _get_query_get_clause(self, data):
         return self.env['account.move.line'].with_context(data['form'].get('used_context', {}))._query_get()
 
@@ -98,19 +172,17 @@ class ReportJournal(models.AbstractModel):
         if not data.get('form'):
             raise UserError(_("Form content is missing, this report cannot be printed."))
 
-        target_move = data['form'].get('target_move', 'all')
-        sort_selection = data['form'].get('sort_selection', 'date')
-
-        res = {}
-        for journal in data['form']['journal_ids']:
-            res[journal] = self.with_context(data['form'].get('used_context', {})).lines(target_move, journal, sort_selection, data)
+        lines, totals, taxes = self.with_context(data['form'].get('used_context', {}))._get_journal_data(
+            data, data['form']['journal_ids'])
         return {
             'doc_ids': data['form']['journal_ids'],
             'doc_model': self.env['account.journal'],
             'data': data,
             'docs': self.env['account.journal'].browse(data['form']['journal_ids']),
             'time': time,
-            'lines': res,
+            'lines': lines,
+            'journal_totals': totals,
+            'journal_taxes': taxes,
             'sum_credit': self._sum_credit,
             'sum_debit': self._sum_debit,
             'get_taxes': self._get_taxes,
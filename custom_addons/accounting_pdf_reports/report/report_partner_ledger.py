@@ -65,10 +65,56 @@ class ReportPartnerLedger(models.AbstractModel):
             result = contemp[0] or 0.0
         return result
 
-    @api.model
-    def _get_report_values(self, docids, data=None):
-        if not data.get('form'):
-            raise UserError(_("Form content is missing, this report cannot be printed."))
+    def _get_partner_ledger(self, data, partner_ids):
+        """ Compute the lines and totals of all the partners in one query,
+            ordered by partner and date, instead of the four queries per
+            partner done by the :meth:`_lines` and :meth:`_sum_partner`
+            template callbacks.
+
+            :returns: a dictionary {partner_id: {'lines': [...], 'debit',
+                'credit', 'debit - credit'}}, lines carrying their running
+                ``progress`` like those of :meth:`_lines`
+        """
+        ledger = {
+            partner_id: {'lines': [], 'debit': 0.0, 'credit': 0.0, 'debit - credit': 0.0}
+            for partner_id in partner_ids
+        }
+        if not partner_ids:
+            return ledger
+        currency = self.env['res.currency']
+        query_get_data = self.env['account.move.line'].with_context(data['form'].get('used_context', {}))._query_get()
+        reconcile_clause = "" if data['form']['reconciled'] else ' AND "account_move_line".full_reconcile_id IS NULL '
+        params = [tuple(partner_ids), tuple(data['computed']['move_state']), tuple(data['computed']['account_ids'])] + query_get_data[2]
+        query = """
+            SELECT "account_move_line".id, "account_move_line".partner_id, "account_move_line".date, j.code, acc.name->>'en_US' as a_name, "account_move_line".ref, m.name as move_name, "account_move_line".name, "account_move_line".debit, "account_move_line".credit, "account_move_line".amount_currency,"account_move_line".currency_id, c.symbol AS currency_code
+            FROM """ + query_get_data[0] + """
+            LEFT JOIN account_journal j ON ("account_move_line".journal_id = j.id)
+            LEFT JOIN account_account acc ON ("account_move_line".account_id = acc.id)
+            LEFT JOIN res_currency c ON ("account_move_line".currency_id=c.id)
+            LEFT JOIN account_move m ON (m.id="account_move_line".move_id)
+            WHERE "account_move_line".partner_id IN %s
+                AND m.state IN %s
+                AND "account_move_line".account_id IN %s AND """ + query_get_data[1] + reconcile_clause + """
+                ORDER BY "account_move_line".partner_id, "account_move_line".date, "account_move_line".id"""
+        self.env.cr.execute(query, tuple(params))
+        for r in self.env.cr.dictfetchall():
+            values = ledger[r.pop('partner_id')]
+            r['displayed_name'] = '-'.join(
+                r[field_name] for field_name in ('move_name', 'ref', 'name')
+                if r[field_name] not in (None, '', '/')
+            )
+            values['debit'] += r['debit']
+            values['credit'] += r['credit']
+            values['debit - credit'] += r['debit'] - r['credit']
+            r['progress'] = values['debit - credit']
+            r['currency_id'] = currency.browse(r.get('currency_id'))
+            values['lines'].append(r)
+        return ledger
+
+    def _get_partners(self, data):
+        """ Fill ``data['computed']`` and return the partners to print,
+            sorted like they are printed.
+        """
         data['computed'] = {}
 
         obj_partner = self.env['res.partner']
@@ -109,7 +155,33 @@ class ReportPartnerLedger(models.AbstractModel):
             partner_ids = [res['partner_id'] for res in
                            self.env.cr.dictfetchall()]
         partners = obj_partner.browse(partner_ids)
-        partners = sorted(partners, key=lambda x: (x.ref or '', x.name or ''))
+        return sorted(partners, key=lambda x: (x.ref or '', x.name or ''))
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        if not data.get('form'):
+            raise UserError(_("Form content is missing, this report cannot be printed."))
+        if data.get('computed') and data['form'].get('partner_ids'):
+            # partners already selected and sorted, e.g. by a printing job
+            partners = self.env['res.partner'].browse(data['form']['partner_ids'])
+        else:
+            partners = self._get_partners(data)
+        partner_ids = [partner.id for partner in partners]
+
+        # The context key 'partner_ledger_legacy' {Boolean} makes the template
+        # query the lines and sums of each partner on the fly
+        ledger = {}
+        lines, sum_partner = self._lines, self._sum_partner
+        if not self.env.context.get('partner_ledger_legacy'):
+            ledger = self._get_partner_ledger(data, partner_ids)
+
+            def lines(data, partner):
+                return ledger[partner.id]['lines']
+
+            def sum_partner(data, partner, field):
+                if field not in ['debit', 'credit', 'debit - credit']:
+                    return
+                return ledger[partner.id][field]
 
         return {
             'doc_ids': partner_ids,
@@ -117,6 +189,7 @@ class ReportPartnerLedger(models.AbstractModel):
             'data': data,
             'docs': partners,
             'time': time,
-            'lines': self._lines,
-            'sum_partner': self._sum_partner,
+            'ledger': ledger,
+            'lines': lines,
+            'sum_partner': sum_partner,
         }
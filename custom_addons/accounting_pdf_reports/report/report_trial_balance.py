@@ -20,24 +20,27 @@ class ReportTrialBalance(models.AbstractModel):
                 `balance`: total amount of balance,
         """
 
-        account_result = {}
-        # Prepare sql query base on selected parameters from wizard
-        tables, where_clause, where_params = self.env['account.move.line']._query_get()
-        tables = tables.replace('"','')
-        if not tables:
-            tables = 'account_move_line'
-        wheres = [""]
-        if where_clause.strip():
-            wheres.append(where_clause.strip())
-        filters = " AND ".join(wheres)
-        # compute the balance, debit and credit for the provided accounts
-        request = ("SELECT account_id AS id, SUM(debit) AS debit, SUM(credit) AS credit, "
-                   "(SUM(debit) - SUM(credit)) AS balance" +\
-                   " FROM " + tables + " WHERE account_id IN %s " + filters + " GROUP BY account_id")
-        params = (tuple(accounts.ids),) + tuple(where_params)
-        self.env.cr.execute(request, params)
-        for row in self.env.cr.dictfetchall():
-            account_result[row.pop('id')] = row
+        # Read the daily balances when the wizard filters allow it
+        account_result = self.env['account.balance.daily']._get_account_balances(accounts.ids)
+        if account_result is None:
+            account_result = {}
+            # Prepare sql query base on selected parameters from wizard
+            tables, where_clause, where_params = self.env['account.move.line']._query_get()
+            tables = tables.replace('"','')
+            if not tables:
+                tables = 'account_move_line'
+            wheres = [""]
+            if where_clause.strip():
+                wheres.append(where_clause.strip())
+            filters = " AND ".join(wheres)
+            # compute the balance, debit and credit for the provided accounts
+            request = ("SELECT account_id AS id, SUM(debit) AS debit, SUM(credit) AS credit, "
+                       "(SUM(debit) - SUM(credit)) AS balance" +\
+                       " FROM " + tables + " WHERE account_id IN %s " + filters + " GROUP BY account_id")
+            params = (tuple(accounts.ids),) + tuple(where_params)
+            self.env.cr.execute(request, params)
+            for row in self.env.cr.dictfetchall():
+                account_result[row.pop('id')] = row
 
         account_res = []
         for account in accounts:
@@ -1,3 +1,4 @@
+import copy
 from odoo import fields, models, api, _
 
 
@@ -20,5 +21,27 @@ class AccountPartnerLedger(models.TransientModel):
 
     def _print_report(self, data):
         data = self._get_report_data(data)
-        return self.env.ref('accounting_pdf_reports.action_report_partnerledger').with_context(landscape=True).\
-            report_action(self, data=data)
+        report = self.env.ref('accounting_pdf_reports.action_report_partnerledger')
+        partner_data = copy.deepcopy(data)
+        partners = self.env['report.accounting_pdf_reports.report_partnerledger']._get_partners(partner_data)
+        if len(partners) > self.env['account.report.partner.ledger.job']._pdf_chunk_size:
+            return self._print_report_job(partner_data, [partner.id for partner in partners])
+        return report.with_context(landscape=True).report_action(self, data=data)
+
+    def _print_report_job(self, data, partner_ids):
+        """ Queue the printing of the ledger of ``partner_ids``, rendered in
+            several PDF files by a cron job, and open it.
+        """
+        job = self.env['account.report.partner.ledger.job'].create({
+            'name': _('Partner Ledger of %(count)s partners', count=len(partner_ids)),
+            'company_id': self.company_id.id or self.env.company.id,
+            'report_data': data,
+            'partner_ids': partner_ids,
+        })
+        return {
+            'name': _('Partner Ledger'),
+            'type': 'ir.actions.act_window',
+            'res_model': job._name,
+            'res_id': job.id,
+            'view_mode': 'form',
+        }
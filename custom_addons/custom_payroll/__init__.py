@@ -1,2 +1,16 @@
 # ./__init__.py
 from . import models
+
+
+def uninstall_hook(env):
+    # the dashboard triggers would otherwise outlive their tables and break
+    # every write on the payslips and employees
+    env.cr.execute("""
+        DROP TRIGGER IF EXISTS custom_payroll_dashboard_insert ON custom_payroll_payslip;
+        DROP TRIGGER IF EXISTS custom_payroll_dashboard_update ON custom_payroll_payslip;
+        DROP TRIGGER IF EXISTS custom_payroll_dashboard_delete ON custom_payroll_payslip;
+        DROP TRIGGER IF EXISTS custom_payroll_dashboard_employee ON custom_payroll_employee;
+        DROP FUNCTION IF EXISTS custom_payroll_dashboard_refresh();
+        DROP FUNCTION IF EXISTS custom_payroll_dashboard_refresh_employee();
+        DROP FUNCTION IF EXISTS custom_payroll_dashboard_refresh_keys(integer[], date[]);
+    """)
@@ -31,4 +31,5 @@
     'auto_install': False,
     'license': 'LGPL-3',
     'post_init_hook': '_post_init_payroll',
+    'uninstall_hook': 'uninstall_hook',
 }
@@ -74,28 +74,50 @@ class CustomPayrollContract(models.Model):
             if contract.date_end and contract.date_start > contract.date_end:
                 raise ValidationError('Contract start date must be before end date!')
     
-    @api.model
-    def create(self, vals):
-        if vals.get('name', 'New') == 'New':
-            vals['name'] = self.env['ir.sequence'].next_by_code('custom_payroll.contract') or 'New'
-        contract = super().create(vals)
-        if contract.state == 'active':
-            contract._deactivate_other_contracts()
-        return contract
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get('name', 'New') == 'New':
+                vals['name'] = self.env['ir.sequence'].next_by_code('custom_payroll.contract') or 'New'
+        contracts = super().create(vals_list)
+        contracts.filtered(lambda c: c.state == 'active')._deactivate_other_contracts()
+        return contracts
     
     def write(self, vals):
-        if 'state' in vals and vals['state'] == 'active':
+        res = super().write(vals)
+        if vals.get('state') == 'active':
             self._deactivate_other_contracts()
-        return super().write(vals)
+        return res
     
     def _deactivate_other_contracts(self):
-        for contract in self:
-            other_contracts = self.search([
-                ('employee_id', '=', contract.employee_id.id),
-                ('id', '!=', contract.id),
-                ('state', '=', 'active'),
-            ])
-            other_contracts.write({'state': 'expired'})
+        """Expire the contracts superseded by the active contracts of self
+
+        The most recent contract of self is kept for each employee, the
+        other active contracts of their employees are expired with one
+        query, and the active contract of the employees is recomputed.
+        """
+        if not self:
+            return
+        self.flush_model(['employee_id', 'date_start', 'state'])
+        self.env.cr.execute("""
+            WITH kept AS (
+                SELECT DISTINCT ON (employee_id) id, employee_id
+                FROM custom_payroll_contract
+                WHERE id IN %s
+                ORDER BY employee_id, date_start DESC, id DESC
+            )
+            UPDATE custom_payroll_contract c
+            SET state = 'expired', write_uid = %s, write_date = (now() at time zone 'UTC')
+            FROM kept
+            WHERE c.employee_id = kept.employee_id
+                AND c.id != kept.id
+                AND c.state = 'active'
+            RETURNING c.id
+        """, [tuple(self.ids), self.env.uid])
+        expired = self.browse([row[0] for row in self.env.cr.fetchall()])
+        expired.invalidate_recordset(['state', 'write_uid', 'write_date'])
+        employees = self.employee_id
+        self.env.add_to_compute(employees._fields['active_contract_id'], employees)
     
     def action_activate(self):
         self.write({'state': 'active'})
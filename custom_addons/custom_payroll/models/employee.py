@@ -29,7 +29,7 @@ class CustomPayrollEmployee(models.Model):
     active_contract_id = fields.Many2one('custom_payroll.contract', string='Active Contract',
                                         compute='_compute_active_contract', store=True)
     payslip_ids = fields.One2many('custom_payroll.payslip', 'employee_id', string='Payslips')
-    loan_ids = fields.One2many('custom_payroll.loan', 'employee_id', string='Loans')
+    loan_ids = fields.One2many('custom_payroll.employee_loan', 'employee_id', string='Loans')
     work_entry_ids = fields.One2many('custom_payroll.work_entry', 'employee_id', string='Work Entries')
     
     # Computed fields
@@ -52,9 +52,33 @@ class CustomPayrollEmployee(models.Model):
     
     @api.depends('contract_ids', 'contract_ids.state')
     def _compute_active_contract(self):
+        active_contracts = self.filtered('id')._get_active_contracts()
         for employee in self:
-            active_contract = employee.contract_ids.filtered(lambda c: c.state == 'active')
-            employee.active_contract_id = active_contract[0] if active_contract else False
+            if employee.id:
+                employee.active_contract_id = active_contracts.get(employee.id, False)
+            else:
+                active_contract = employee.contract_ids.filtered(lambda c: c.state == 'active')
+                employee.active_contract_id = active_contract[0] if active_contract else False
+    
+    def _get_active_contracts(self):
+        """Return the most recent active contract of the employees, read
+        with one query, as {employee_id: contract_id}"""
+        if not self:
+            return {}
+        self.env['custom_payroll.contract'].flush_model(['employee_id', 'date_start', 'state', 'active'])
+        self.env.cr.execute("""
+            SELECT employee_id, id
+            FROM (
+                SELECT employee_id, id,
+                    ROW_NUMBER() OVER (PARTITION BY employee_id ORDER BY date_start DESC, id DESC) AS rank
+                FROM custom_payroll_contract
+                WHERE employee_id IN %s
+                    AND state = 'active'
+                    AND active
+            ) contracts
+            WHERE rank = 1
+        """, [tuple(self.ids)])
+        return dict(self.env.cr.fetchall())
     
     @api.model
     def create(self, vals):
@@ -20,13 +20,16 @@ class CustomPayrollLeaveDays(models.Model):
     paid = fields.Boolean(string='Paid Leave', default=True)
     amount = fields.Float(string='Amount', compute='_compute_amount', store=True)
     
-    @api.depends('number_of_days', 'paid', 'payslip_id.contract_id')
+    @api.depends('number_of_days', 'paid', 'payslip_id.contract_id', 'payslip_id.contract_id.wage',
+                 'payslip_id.contract_id.wage_type', 'payslip_id.contract_id.working_days',
+                 'payslip_id.contract_id.working_hours')
     def _compute_amount(self):
+        WorkedDays = self.env['custom_payroll.worked_days']
         for line in self:
             if line.paid:
                 contract = line.payslip_id.contract_id
                 if contract:
-                    daily_rate = contract.wage / 22
+                    daily_rate = WorkedDays._get_rates(contract)[0]
                     line.amount = line.number_of_days * daily_rate
                 else:
                     line.amount = 0
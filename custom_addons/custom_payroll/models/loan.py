@@ -8,7 +8,7 @@ class EmployeeLoan(models.Model):
     _inherit = ['mail.thread', 'payroll.account.mixin']
     
     name = fields.Char(string='Loan Reference', required=True, readonly=True, default='New')
-    employee_id = fields.Many2one('hr.employee', string='Employee', required=True)
+    employee_id = fields.Many2one('custom_payroll.employee', string='Employee', required=True)
     
     loan_amount = fields.Float(string='Loan Amount', required=True)
     interest_rate = fields.Float(string='Interest Rate (%)', default=0.0)
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from dateutil.relativedelta import relativedelta
+
 from odoo import models, fields, api
 
 class CustomPayrollLoanInstallment(models.Model):
@@ -6,7 +8,7 @@ class CustomPayrollLoanInstallment(models.Model):
     _description = 'Loan Installment'
     _order = 'sequence'
     
-    loan_id = fields.Many2one('custom_payroll.loan', string='Loan', required=True, ondelete='cascade')
+    loan_id = fields.Many2one('custom_payroll.employee_loan', string='Loan', required=True, ondelete='cascade')
     employee_id = fields.Many2one('custom_payroll.employee', string='Employee', related='loan_id.employee_id', store=True)
     sequence = fields.Integer(string='Installment #', required=True)
     due_date = fields.Date(string='Due Date', required=True)
@@ -18,29 +20,152 @@ class CustomPayrollLoanInstallment(models.Model):
         ('paid', 'Paid'),
         ('overdue', 'Overdue'),
         ('cancelled', 'Cancelled'),
-    ], string='Status', default='due')
+    ], string='Status', default='due', index=True)
     payment_date = fields.Date(string='Payment Date')
-    payslip_id = fields.Many2one('custom_payroll.payslip', string='Deducted From Payslip')
+    payslip_id = fields.Many2one('custom_payroll.payslip', string='Deducted From Payslip', index=True)
     company_id = fields.Many2one('res.company', string='Company', related='loan_id.company_id', store=True)
     days_overdue = fields.Integer(string='Days Overdue', compute='_compute_overdue')
     late_fee = fields.Float(string='Late Fee', default=0)
     
     @api.depends('due_date', 'state')
     def _compute_overdue(self):
+        # The state itself is maintained by _cron_update_overdue
         today = fields.Date.today()
         for installment in self:
-            if installment.state == 'due' and installment.due_date:
-                if installment.due_date < today:
-                    delta = today - installment.due_date
-                    installment.days_overdue = delta.days
-                    installment.state = 'overdue'
-                else:
-                    installment.days_overdue = 0
+            if installment.state in ('due', 'overdue') and installment.due_date and installment.due_date < today:
+                installment.days_overdue = (today - installment.due_date).days
             else:
                 installment.days_overdue = 0
     
+    @api.model
+    def _cron_update_overdue(self):
+        """Mark the installments past their due date as overdue"""
+        self.search([
+            ('state', '=', 'due'),
+            ('due_date', '<', fields.Date.today()),
+        ]).write({'state': 'overdue'})
+    
+    @api.model
+    def _get_due_installments(self, employees, date_to):
+        """Return the installments of employees due by date_to and not
+        deducted from a payslip yet, read with one query, as
+        {employee_id: installments}"""
+        installments = self.search([
+            ('employee_id', 'in', employees.ids),
+            ('state', 'in', ('due', 'overdue')),
+            ('due_date', '<=', date_to),
+            ('payslip_id', '=', False),
+        ], order='employee_id, due_date, sequence')
+
+        result = {}
+        for installment in installments:
+            result.setdefault(installment.employee_id.id, []).append(installment.id)
+        return {employee_id: self.browse(ids) for employee_id, ids in result.items()}
+    
+    @api.model
+    def _prepare_deductions(self, installments):
+        """Return the payslip deductions of installments, as a list of
+        (name, code, amount)"""
+        return [
+            (f'Loan Repayment {installment.loan_id.name} #{installment.sequence}', 'LOAN',
+             installment.amount + installment.late_fee)
+            for installment in installments
+        ]
+    
+    def _attach_to_payslips(self, payslips):
+        """Link the installments to the payslip of their employee among
+        payslips, with one query"""
+        if not self or not payslips:
+            return
+        self.flush_recordset(['employee_id', 'payslip_id'])
+        payslips.flush_recordset(['employee_id'])
+        self.env.cr.execute("""
+            UPDATE custom_payroll_loan_installment i
+            SET payslip_id = p.id
+            FROM custom_payroll_payslip p
+            WHERE i.id IN %s
+                AND p.id IN %s
+                AND i.employee_id = p.employee_id
+        """, [tuple(self.ids), tuple(payslips.ids)])
+        self.invalidate_recordset(['payslip_id'])
+        payslips.invalidate_recordset(['loan_installment_ids'])
+    
     def action_mark_as_paid(self):
         self.write({
             'state': 'paid',
             'payment_date': fields.Date.today(),
         })
+        self.loan_id.filtered(
+            lambda loan: all(installment.state in ('paid', 'cancelled') for installment in loan.installment_ids)
+        ).action_mark_paid()
+
+
+class EmployeeLoan(models.Model):
+    _inherit = 'custom_payroll.employee_loan'
+    
+    installment_ids = fields.One2many('custom_payroll.loan_installment', 'loan_id', string='Installments')
+    
+    def action_disburse(self):
+        res = super().action_disburse()
+        self._generate_installments()
+        return res
+    
+    def action_cancel(self):
+        res = super().action_cancel()
+        self.installment_ids.filtered(lambda i: i.state in ('due', 'overdue')).write({'state': 'cancelled'})
+        return res
+    
+    def action_generate_installments(self):
+        """Generate the repayment schedule of the loans having none"""
+        self._generate_installments()
+        return True
+    
+    def _generate_installments(self):
+        """Create the installments of the loans without installments, with
+        one create for all the loans"""
+        loans = self.filtered(lambda loan: not loan.installment_ids)
+        vals_list = []
+        for loan in loans:
+            vals_list.extend(loan._prepare_installment_values())
+        return self.env['custom_payroll.loan_installment'].create(vals_list)
+    
+    def _prepare_installment_values(self):
+        """
+        Get the repayment schedule of the loan: one monthly repayment per
+        month from the repayment start date. The interest is allocated to
+        the installments by the sum of the digits (rule of 78), so that the
+        early installments carry more interest; the last installment takes
+        the rounding differences.
+        Returns:
+            list of custom_payroll.loan_installment values
+        """
+        self.ensure_one()
+        months = self.repayment_months
+        if months <= 0:
+            return []
+        
+        currency = self.company_id.currency_id
+        total_interest = self.total_amount - self.loan_amount
+        digits_sum = months * (months + 1) / 2
+        
+        vals_list = []
+        scheduled_amount = scheduled_interest = 0.0
+        for number in range(1, months + 1):
+            if number < months:
+                amount = currency.round(self.monthly_repayment)
+                interest = currency.round(total_interest * (months - number + 1) / digits_sum)
+            else:
+                amount = currency.round(self.total_amount - scheduled_amount)
+                interest = currency.round(total_interest - scheduled_interest)
+            scheduled_amount += amount
+            scheduled_interest += interest
+            vals_list.append({
+                'loan_id': self.id,
+                'sequence': number,
+                'due_date': self.repayment_start_date + relativedelta(months=number - 1),
+                'amount': amount,
+                'interest': interest,
+                'principal': currency.round(amount - interest),
+            })
+        
+        return vals_list
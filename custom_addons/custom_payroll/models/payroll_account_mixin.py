@@ -1,10 +1,29 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Payroll account types of the payslip lines without accounts, by line code;
+# other allowances and deductions go to 'other_allowance_expense' and
+# 'other_deduction_payable'
+PAYSLIP_LINE_ACCOUNT_TYPES = {
+    'BASIC': 'salary_expense',
+    'HOUSE': 'housing_expense',
+    'TRANS': 'transport_expense',
+    'MEDICAL': 'medical_expense',
+    'OVERTIME': 'overtime_expense',
+    'BONUS': 'bonus_expense',
+    'PAYE': 'tax_payable',
+    'NSSF': 'nssf_payable',
+    'NHIF': 'nhif_payable',
+    'PENSION': 'pension_payable',
+    'LOAN': 'loan_receivable',
+}
+
 class PayrollAccountMixin(models.AbstractModel):
     """Mixin to handle payroll account lookups"""
     _name = 'payroll.account.mixin'
@@ -24,15 +43,9 @@ class PayrollAccountMixin(models.AbstractModel):
         
         company_id = company_id or self.env.company.id
         
-        # Search for the account
-        account = self.env['custom_accounting.account'].search([
-            ('payroll_account_type', '=', account_type_code),
-            ('company_id', '=', company_id),
-            ('active', '=', True)
-        ], limit=1)
-        
-        if account:
-            return account
+        account_id = self._get_payroll_account_map(company_id).get(account_type_code)
+        if account_id:
+            return self.env['custom_accounting.account'].browse(account_id)
         
         # Account not found - try to create it
         account = self._create_missing_payroll_account(account_type_code, company_id)
@@ -43,8 +56,49 @@ class PayrollAccountMixin(models.AbstractModel):
                 "Please setup payroll accounts in Accounting → Payroll Accounts."
             ) % account_type_code)
         
+        self._get_payroll_account_map(company_id)[account_type_code] = account.id
         return account
     
+    @api.model
+    def _get_payroll_account_map(self, company_id):
+        """
+        Get the active payroll accounts of a company, read with one query
+        and cached on the cursor for the duration of the request
+        Returns:
+            dict {payroll_account_type: account id}, with the first account
+            by code of each type
+        """
+        cache = self.env.cr.cache.setdefault('payroll_account_map', {})
+        if company_id not in cache:
+            cache[company_id] = self._read_payroll_account_map(company_id)
+        return cache[company_id]
+    
+    @api.model
+    def _read_payroll_account_map(self, company_id):
+        accounts = self.env['custom_accounting.account'].sudo().search_read([
+            ('payroll_account_type', 'not in', (False, 'none')),
+            ('company_id', '=', company_id),
+            ('active', '=', True)
+        ], ['payroll_account_type'])
+        
+        account_map = {}
+        for account in accounts:
+            account_map.setdefault(account['payroll_account_type'], account['id'])
+        return account_map
+    
+    @api.model
+    def _get_bank_account_id(self, company_id):
+        """Get the first active cash/bank account of a company, cached on
+        the cursor for the duration of the request"""
+        cache = self.env.cr.cache.setdefault('payroll_bank_account_id', {})
+        if company_id not in cache:
+            cache[company_id] = self.env['custom_accounting.account'].sudo().search([
+                ('account_category', '=', 'cash_bank'),
+                ('company_id', '=', company_id),
+                ('active', '=', True)
+            ], limit=1).id
+        return cache[company_id]
+    
     def _create_missing_payroll_account(self, account_type_code, company_id):
         """Create missing payroll account automatically"""
         # Mapping of payroll account types to account details
@@ -174,20 +228,15 @@ class PayrollAccountMixin(models.AbstractModel):
         
         # Find available code in range
         start_code, end_code = mapping['code_range']
-        existing_codes = self.env['custom_accounting.account'].search([
-            ('company_id', '=', company_id),
-            ('code', '>=', str(start_code)),
-            ('code', '<=', str(end_code))
-        ]).mapped('code')
-        
-        code = None
-        for num in range(start_code, end_code + 1):
-            if str(num) not in existing_codes:
-                code = str(num)
-                break
+        existing_codes = {account['code'] for account in self.env['custom_accounting.account'].with_context(
+            active_test=False).search_read([
+                ('company_id', '=', company_id),
+                ('code', '>=', str(start_code)),
+                ('code', '<=', str(end_code))
+            ], ['code'])}
         
-        if not code:
-            code = str(start_code)  # Fallback
+        code = next((str(num) for num in range(start_code, end_code + 1) if str(num) not in existing_codes),
+                    str(start_code))  # Fallback
         
         try:
             # Create the account
@@ -214,11 +263,7 @@ class PayrollAccountMixin(models.AbstractModel):
         company_id = company_id or self.env.company.id
         
         # First try to find cash/bank account
-        bank_account = self.env['custom_accounting.account'].search([
-            ('account_category', '=', 'cash_bank'),
-            ('company_id', '=', company_id),
-            ('active', '=', True)
-        ], limit=1)
+        bank_account = self.env['custom_accounting.account'].browse(self._get_bank_account_id(company_id))
         
         if not bank_account:
             # Create a default bank account
@@ -230,6 +275,7 @@ class PayrollAccountMixin(models.AbstractModel):
                 'company_id': company_id,
                 'reconcile': True,
             })
+            self.env.cr.cache['payroll_bank_account_id'][company_id] = bank_account.id
         
         return bank_account
     
@@ -243,16 +289,8 @@ class PayrollAccountMixin(models.AbstractModel):
             'tax_payable',
         ]
         
-        missing = []
-        for acc_type in required_accounts:
-            account = self.env['custom_accounting.account'].search([
-                ('payroll_account_type', '=', acc_type),
-                ('company_id', '=', company_id),
-                ('active', '=', True)
-            ], limit=1)
-            
-            if not account:
-                missing.append(acc_type)
+        account_map = self._get_payroll_account_map(company_id)
+        missing = [acc_type for acc_type in required_accounts if acc_type not in account_map]
         
         if missing:
             account_names = {
@@ -268,3 +306,78 @@ class PayrollAccountMixin(models.AbstractModel):
             ) % ", ".join(missing_names))
         
         return True
+    
+    def _get_payroll_journal(self, company_id=None):
+        """Get or create the payroll journal of the company"""
+        company_id = company_id or self.env.company.id
+        journal = self.env['custom_accounting.journal'].search([
+            ('code', '=', 'PAY'),
+            ('company_id', '=', company_id)
+        ], limit=1)
+        
+        if not journal:
+            journal = self.env['custom_accounting.journal'].create({
+                'name': 'Payroll Journal',
+                'code': 'PAY',
+                'type': 'general',
+                'company_id': company_id,
+            })
+        
+        return journal
+    
+    def _create_payslips_move(self, payslips, date, ref):
+        """
+        Create one journal entry for payslips of a company, with one line per
+        account. The payslip lines are summed by code and account with a
+        single grouped query; allowances are debited on their expense
+        accounts, deductions credited on their payable accounts and the net
+        salaries credited on the salaries payable account.
+        Returns:
+            custom_accounting.move record
+        """
+        company = payslips.company_id[:1] or self.env.company
+        currency = company.currency_id
+        self._validate_payroll_accounts(company.id)
+        
+        groups = self.env['custom_payroll.payslip_line']._read_group(
+            [('slip_id', 'in', payslips.ids), ('category', 'in', ('allowance', 'deduction'))],
+            ['code', 'category', 'account_debit', 'account_credit'],
+            ['total:sum'],
+        )
+        
+        # Balance (debit - credit) by account
+        balances = defaultdict(float)
+        for code, category, account_debit, account_credit, total in groups:
+            if category == 'allowance':
+                account = account_debit or self._get_payroll_account(
+                    PAYSLIP_LINE_ACCOUNT_TYPES.get(code, 'other_allowance_expense'), company.id)
+                balances[account.id] += total
+            else:
+                account = account_credit or self._get_payroll_account(
+                    PAYSLIP_LINE_ACCOUNT_TYPES.get(code, 'other_deduction_payable'), company.id)
+                balances[account.id] -= total
+        
+        # Net salaries, from the rounded balances so that the entry is balanced
+        balances = {account_id: currency.round(balance) for account_id, balance in balances.items()}
+        payable_account = self._get_payroll_account('salary_payable', company.id)
+        balances[payable_account.id] = balances.get(payable_account.id, 0.0) - sum(balances.values())
+        
+        lines = []
+        for account_id, balance in balances.items():
+            if currency.is_zero(balance):
+                continue
+            lines.append((0, 0, {
+                'account_id': account_id,
+                'debit': balance if balance > 0 else 0,
+                'credit': -balance if balance < 0 else 0,
+                'name': ref,
+            }))
+        
+        return self.env['custom_accounting.move'].create({
+            'date': date,
+            'ref': ref,
+            'journal_id': self._get_payroll_journal(company.id).id,
+            'company_id': company.id,
+            'line_ids': lines,
+            'state': 'posted',
+        })
@@ -1,39 +1,310 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
-from datetime import datetime, timedelta
+from odoo import models, fields, api, tools
+
+# States of the payslips counted by the dashboard
+DASHBOARD_PAYSLIP_STATES = ('confirmed', 'paid')
 
 class CustomPayrollDashboard(models.Model):
+    """Monthly payroll totals of the confirmed and paid payslips.
+    
+    The rows are stored in a table kept up to date by PostgreSQL triggers on
+    the payslips: each statement changing payslips recomputes the
+    (company, month) keys it touched from the payslips of those months only.
+    Payslips are counted in the department their employee belongs to now.
+    The id of a row is derived from its key, company_id * 1000000 + YYYYMM,
+    so it stays the same across refreshes. The same triggers maintain the
+    breakdown by department, custom_payroll.payroll_dashboard_department.
+    """
     _name = 'custom_payroll.payroll_dashboard'
     _description = 'Payroll Dashboard'
-    _auto = False  # This is a SQL view
-    
-    # These fields will be populated by SQL query
-    month = fields.Char(string='Month')
-    total_employees = fields.Integer(string='Total Employees')
-    total_payslips = fields.Integer(string='Total Payslips')
-    total_basic = fields.Float(string='Total Basic Salary')
-    total_gross = fields.Float(string='Total Gross Salary')
-    total_deductions = fields.Float(string='Total Deductions')
-    total_net = fields.Float(string='Total Net Salary')
-    avg_salary = fields.Float(string='Average Salary')
+    _auto = False
+    _order = 'month_date desc, company_id'
+    _depends = {
+        'custom_payroll.payslip': [
+            'state', 'company_id', 'date_from', 'employee_id',
+            'basic_salary', 'gross_salary', 'total_deductions', 'net_salary',
+        ],
+        'custom_payroll.employee': ['department_id'],
+    }
+    
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    month_date = fields.Date(string='Month Start', readonly=True)
+    month = fields.Char(string='Month', readonly=True)
+    total_employees = fields.Integer(string='Total Employees', readonly=True)
+    total_payslips = fields.Integer(string='Total Payslips', readonly=True)
+    total_basic = fields.Float(string='Total Basic Salary', readonly=True)
+    total_gross = fields.Float(string='Total Gross Salary', readonly=True)
+    total_deductions = fields.Float(string='Total Deductions', readonly=True)
+    total_net = fields.Float(string='Total Net Salary', readonly=True)
+    avg_salary = fields.Float(string='Average Salary', readonly=True)
+    department_ids = fields.One2many('custom_payroll.payroll_dashboard_department', 'dashboard_id',
+                                     string='Departments', readonly=True)
     
     def init(self):
-        """Initialize the SQL view"""
-        self.env.cr.execute("""
-            CREATE OR REPLACE VIEW custom_payroll_payroll_dashboard AS (
-                SELECT 
-                    ROW_NUMBER() OVER () as id,
-                    TO_CHAR(date_from, 'YYYY-MM') as month,
-                    COUNT(DISTINCT employee_id) as total_employees,
-                    COUNT(*) as total_payslips,
-                    SUM(basic_salary) as total_basic,
-                    SUM(gross_salary) as total_gross,
-                    SUM(total_deductions) as total_deductions,
-                    SUM(net_salary) as total_net,
-                    AVG(net_salary) as avg_salary
-                FROM custom_payroll_payslip
-                WHERE state IN ('confirmed', 'paid')
-                GROUP BY TO_CHAR(date_from, 'YYYY-MM')
-                ORDER BY month DESC
-            )
+        """Create the aggregate tables and the triggers maintaining them"""
+        cr = self.env.cr
+        tools.drop_view_if_exists(cr, 'custom_payroll_payroll_dashboard')
+        created = not tools.table_exists(cr, 'custom_payroll_payroll_dashboard')
+        cr.execute("""
+            CREATE TABLE IF NOT EXISTS custom_payroll_payroll_dashboard (
+                id bigint PRIMARY KEY,
+                company_id integer NOT NULL,
+                month_date date NOT NULL,
+                month varchar,
+                total_employees integer,
+                total_payslips integer,
+                total_basic numeric,
+                total_gross numeric,
+                total_deductions numeric,
+                total_net numeric,
+                avg_salary numeric
+            );
+            CREATE TABLE IF NOT EXISTS custom_payroll_payroll_dashboard_department (
+                id serial PRIMARY KEY,
+                dashboard_id bigint NOT NULL,
+                company_id integer NOT NULL,
+                month_date date NOT NULL,
+                department_id integer,
+                total_employees integer,
+                total_payslips integer,
+                total_basic numeric,
+                total_gross numeric,
+                total_deductions numeric,
+                total_net numeric
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS custom_payroll_payroll_dashboard_department_key_idx
+                ON custom_payroll_payroll_dashboard_department (company_id, month_date, (COALESCE(department_id, 0)));
+            CREATE INDEX IF NOT EXISTS custom_payroll_payroll_dashboard_department_dashboard_idx
+                ON custom_payroll_payroll_dashboard_department (dashboard_id);
+            CREATE INDEX IF NOT EXISTS custom_payroll_payslip_company_date_from_idx
+                ON custom_payroll_payslip (company_id, date_from);
+
+            -- recompute the rows of the given (company, month) keys from the
+            -- payslips: the rows are updated in place to keep their ids, and
+            -- the rows of the keys left without payslips are deleted
+            CREATE OR REPLACE FUNCTION custom_payroll_dashboard_refresh_keys(
+                company_ids integer[], months date[]) RETURNS void AS $$
+            DECLARE
+                kept_ids integer[];
+                kept_month_ids bigint[];
+            BEGIN
+                WITH upserted AS (
+                    INSERT INTO custom_payroll_payroll_dashboard_department (dashboard_id, company_id,
+                        month_date, department_id, total_employees, total_payslips, total_basic,
+                        total_gross, total_deductions, total_net)
+                    SELECT p.company_id * 1000000::bigint + to_char(k.month_date, 'YYYYMM')::integer,
+                        p.company_id, k.month_date, e.department_id,
+                        COUNT(DISTINCT p.employee_id), COUNT(*), SUM(p.basic_salary),
+                        SUM(p.gross_salary), SUM(p.total_deductions), SUM(p.net_salary)
+                    FROM custom_payroll_payslip p
+                    JOIN (SELECT DISTINCT * FROM unnest(company_ids, months)) AS k(company_id, month_date)
+                        ON (p.company_id = k.company_id
+                            AND p.date_from >= k.month_date
+                            AND p.date_from < k.month_date + interval '1 month')
+                    LEFT JOIN custom_payroll_employee e ON (e.id = p.employee_id)
+                    WHERE p.state IN ('confirmed', 'paid')
+                    GROUP BY p.company_id, k.month_date, e.department_id
+                    ON CONFLICT (company_id, month_date, (COALESCE(department_id, 0))) DO UPDATE SET
+                        total_employees = EXCLUDED.total_employees,
+                        total_payslips = EXCLUDED.total_payslips,
+                        total_basic = EXCLUDED.total_basic,
+                        total_gross = EXCLUDED.total_gross,
+                        total_deductions = EXCLUDED.total_deductions,
+                        total_net = EXCLUDED.total_net
+                    RETURNING id
+                )
+                SELECT array_agg(id) INTO kept_ids FROM upserted;
+
+                DELETE FROM custom_payroll_payroll_dashboard_department d
+                USING unnest(company_ids, months) AS k(company_id, month_date)
+                WHERE d.company_id = k.company_id AND d.month_date = k.month_date
+                    AND d.id <> ALL(COALESCE(kept_ids, '{}'));
+
+                -- the monthly rows are upserted from the payslips too: a
+                -- concurrent refresh of the same month conflicts on the row
+                -- and is retried instead of inserting it twice
+                WITH upserted AS (
+                    INSERT INTO custom_payroll_payroll_dashboard (id, company_id, month_date, month,
+                        total_employees, total_payslips, total_basic, total_gross, total_deductions,
+                        total_net, avg_salary)
+                    SELECT p.company_id * 1000000::bigint + to_char(k.month_date, 'YYYYMM')::integer,
+                        p.company_id, k.month_date, to_char(k.month_date, 'YYYY-MM'),
+                        COUNT(DISTINCT p.employee_id), COUNT(*), SUM(p.basic_salary),
+                        SUM(p.gross_salary), SUM(p.total_deductions), SUM(p.net_salary),
+                        SUM(p.net_salary) / COUNT(*)
+                    FROM custom_payroll_payslip p
+                    JOIN (SELECT DISTINCT * FROM unnest(company_ids, months)) AS k(company_id, month_date)
+                        ON (p.company_id = k.company_id
+                            AND p.date_from >= k.month_date
+                            AND p.date_from < k.month_date + interval '1 month')
+                    WHERE p.state IN ('confirmed', 'paid')
+                    GROUP BY p.company_id, k.month_date
+                    ON CONFLICT (id) DO UPDATE SET
+                        total_employees = EXCLUDED.total_employees,
+                        total_payslips = EXCLUDED.total_payslips,
+                        total_basic = EXCLUDED.total_basic,
+                        total_gross = EXCLUDED.total_gross,
+                        total_deductions = EXCLUDED.total_deductions,
+                        total_net = EXCLUDED.total_net,
+                        avg_salary = EXCLUDED.avg_salary
+                    RETURNING id
+                )
+                SELECT array_agg(id) INTO kept_month_ids FROM upserted;
+
+                DELETE FROM custom_payroll_payroll_dashboard d
+                USING unnest(company_ids, months) AS k(company_id, month_date)
+                WHERE d.company_id = k.company_id AND d.month_date = k.month_date
+                    AND d.id <> ALL(COALESCE(kept_month_ids, '{}'));
+            END;
+            $$ LANGUAGE plpgsql;
+
+            -- statement level trigger on the payslips, the keys are read from
+            -- the transition tables of the statement
+            CREATE OR REPLACE FUNCTION custom_payroll_dashboard_refresh() RETURNS trigger AS $$
+            DECLARE
+                company_ids integer[];
+                months date[];
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    SELECT array_agg(company_id), array_agg(month_date)
+                    INTO company_ids, months
+                    FROM (SELECT DISTINCT company_id, date_trunc('month', date_from)::date AS month_date
+                          FROM new_rows WHERE state IN ('confirmed', 'paid')) k;
+                ELSIF TG_OP = 'DELETE' THEN
+                    SELECT array_agg(company_id), array_agg(month_date)
+                    INTO company_ids, months
+                    FROM (SELECT DISTINCT company_id, date_trunc('month', date_from)::date AS month_date
+                          FROM old_rows WHERE state IN ('confirmed', 'paid')) k;
+                ELSE
+                    SELECT array_agg(company_id), array_agg(month_date)
+                    INTO company_ids, months
+                    FROM (
+                        SELECT o.company_id, date_trunc('month', o.date_from)::date AS month_date
+                        FROM old_rows o JOIN new_rows n ON (n.id = o.id)
+                        WHERE (o.state IN ('confirmed', 'paid') OR n.state IN ('confirmed', 'paid'))
+                            AND (o.state, o.company_id, o.date_from, o.employee_id, o.basic_salary,
+                                 o.gross_salary, o.total_deductions, o.net_salary)
+                                IS DISTINCT FROM
+                                (n.state, n.company_id, n.date_from, n.employee_id, n.basic_salary,
+                                 n.gross_salary, n.total_deductions, n.net_salary)
+                        UNION
+                        SELECT n.company_id, date_trunc('month', n.date_from)::date
+                        FROM old_rows o JOIN new_rows n ON (n.id = o.id)
+                        WHERE (o.state IN ('confirmed', 'paid') OR n.state IN ('confirmed', 'paid'))
+                            AND (o.state, o.company_id, o.date_from, o.employee_id, o.basic_salary,
+                                 o.gross_salary, o.total_deductions, o.net_salary)
+                                IS DISTINCT FROM
+                                (n.state, n.company_id, n.date_from, n.employee_id, n.basic_salary,
+                                 n.gross_salary, n.total_deductions, n.net_salary)
+                    ) k
+                    WHERE company_id IS NOT NULL;
+                END IF;
+                IF company_ids IS NOT NULL THEN
+                    PERFORM custom_payroll_dashboard_refresh_keys(company_ids, months);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            -- moving an employee to another department moves its payslips
+            CREATE OR REPLACE FUNCTION custom_payroll_dashboard_refresh_employee() RETURNS trigger AS $$
+            DECLARE
+                company_ids integer[];
+                months date[];
+            BEGIN
+                SELECT array_agg(company_id), array_agg(month_date)
+                INTO company_ids, months
+                FROM (
+                    SELECT DISTINCT p.company_id, date_trunc('month', p.date_from)::date AS month_date
+                    FROM custom_payroll_payslip p
+                    JOIN old_rows o ON (o.id = p.employee_id)
+                    JOIN new_rows n ON (n.id = o.id)
+                    WHERE o.department_id IS DISTINCT FROM n.department_id
+                        AND p.state IN ('confirmed', 'paid')
+                        AND p.company_id IS NOT NULL
+                ) k;
+                IF company_ids IS NOT NULL THEN
+                    PERFORM custom_payroll_dashboard_refresh_keys(company_ids, months);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS custom_payroll_dashboard_insert ON custom_payroll_payslip;
+            CREATE TRIGGER custom_payroll_dashboard_insert
+                AFTER INSERT ON custom_payroll_payslip
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION custom_payroll_dashboard_refresh();
+            DROP TRIGGER IF EXISTS custom_payroll_dashboard_update ON custom_payroll_payslip;
+            CREATE TRIGGER custom_payroll_dashboard_update
+                AFTER UPDATE ON custom_payroll_payslip
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION custom_payroll_dashboard_refresh();
+            DROP TRIGGER IF EXISTS custom_payroll_dashboard_delete ON custom_payroll_payslip;
+            CREATE TRIGGER custom_payroll_dashboard_delete
+                AFTER DELETE ON custom_payroll_payslip
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION custom_payroll_dashboard_refresh();
+            DROP TRIGGER IF EXISTS custom_payroll_dashboard_employee ON custom_payroll_employee;
+            CREATE TRIGGER custom_payroll_dashboard_employee
+                AFTER UPDATE ON custom_payroll_employee
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION custom_payroll_dashboard_refresh_employee();
         """)
+        if created:
+            self._rebuild()
+    
+    @api.model
+    def _rebuild(self):
+        """Recompute the dashboard from all the payslips"""
+        self.env['custom_payroll.payslip'].flush_model()
+        self.env.cr.execute("""
+            SELECT array_agg(company_id), array_agg(month_date)
+            FROM (SELECT DISTINCT company_id, date_trunc('month', date_from)::date AS month_date
+                  FROM custom_payroll_payslip
+                  WHERE state IN %s AND company_id IS NOT NULL) k
+        """, [DASHBOARD_PAYSLIP_STATES])
+        company_ids, months = self.env.cr.fetchone()
+        self.env.cr.execute("DELETE FROM custom_payroll_payroll_dashboard")
+        self.env.cr.execute("DELETE FROM custom_payroll_payroll_dashboard_department")
+        if company_ids:
+            self.env.cr.execute("SELECT custom_payroll_dashboard_refresh_keys(%s, %s)", (company_ids, months))
+        self.invalidate_model()
+        self.env['custom_payroll.payroll_dashboard_department'].invalidate_model()
+    
+    @api.model
+    def _flush_depends(self):
+        # The triggers only see what has been written to the database
+        for model_name, field_names in self._depends.items():
+            self.env[model_name].flush_model(field_names)
+    
+    @api.model
+    def search_read(self, domain=None, fields=None, offset=0, limit=None, order=None, **read_kwargs):
+        self._flush_depends()
+        return super().search_read(domain, fields, offset=offset, limit=limit, order=order, **read_kwargs)
+
+
+class CustomPayrollDashboardDepartment(models.Model):
+    """Monthly payroll totals by department of the employees, maintained with
+    custom_payroll.payroll_dashboard"""
+    _name = 'custom_payroll.payroll_dashboard_department'
+    _description = 'Payroll Dashboard by Department'
+    _auto = False
+    _order = 'month_date desc, total_net desc'
+    _depends = CustomPayrollDashboard._depends
+    
+    dashboard_id = fields.Many2one('custom_payroll.payroll_dashboard', string='Month', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    month_date = fields.Date(string='Month Start', readonly=True)
+    department_id = fields.Many2one('hr.department', string='Department', readonly=True)
+    total_employees = fields.Integer(string='Total Employees', readonly=True)
+    total_payslips = fields.Integer(string='Total Payslips', readonly=True)
+    total_basic = fields.Float(string='Total Basic Salary', readonly=True)
+    total_gross = fields.Float(string='Total Gross Salary', readonly=True)
+    total_deductions = fields.Float(string='Total Deductions', readonly=True)
+    total_net = fields.Float(string='Total Net Salary', readonly=True)
+    
+    @api.model
+    def search_read(self, domain=None, fields=None, offset=0, limit=None, order=None, **read_kwargs):
+        self.env['custom_payroll.payroll_dashboard']._flush_depends()
+        return super().search_read(domain, fields, offset=offset, limit=limit, order=order, **read_kwargs)
@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 class CustomPayrollPayslip(models.Model):
     _name = 'custom_payroll.payslip'
     _description = 'Payslip'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'payroll.account.mixin']
     _order = 'date_from desc, employee_id'
     
     # Basic Information
@@ -27,6 +27,7 @@ class CustomPayrollPayslip(models.Model):
     line_ids = fields.One2many('custom_payroll.payslip_line', 'slip_id', string='Payslip Lines')
     worked_days_ids = fields.One2many('custom_payroll.worked_days', 'payslip_id', string='Worked Days')
     leave_days_ids = fields.One2many('custom_payroll.leave_days', 'payslip_id', string='Leave Days')
+    loan_installment_ids = fields.One2many('custom_payroll.loan_installment', 'payslip_id', string='Loan Installments')
     
     # Totals
     basic_salary = fields.Float(string='Basic Salary', compute='_compute_totals', store=True)
@@ -75,72 +76,32 @@ class CustomPayrollPayslip(models.Model):
             payslip.gross_salary = payslip.basic_salary + payslip.total_allowances
             payslip.net_salary = payslip.gross_salary - payslip.total_deductions
     
-    @api.depends('gross_salary')
+    @api.depends('gross_salary', 'company_id', 'date_to')
     def _compute_tax(self):
-        # Simplified PAYE calculation - should be replaced with actual Nigerian tax brackets
-        for payslip in self:
-            gross = payslip.gross_salary
-            if gross <= 30000:
-                payslip.paye_tax = gross * 0.07
-            elif gross <= 60000:
-                payslip.paye_tax = 2100 + ((gross - 30000) * 0.11)
-            elif gross <= 110000:
-                payslip.paye_tax = 5400 + ((gross - 60000) * 0.15)
-            elif gross <= 160000:
-                payslip.paye_tax = 12900 + ((gross - 110000) * 0.19)
-            elif gross <= 320000:
-                payslip.paye_tax = 22400 + ((gross - 160000) * 0.21)
-            else:
-                payslip.paye_tax = 56000 + ((gross - 320000) * 0.24)
+        amounts = self.env['custom_payroll.tax_bracket_table']._get_amounts('paye', [
+            (payslip.company_id.id, payslip.date_to, payslip.gross_salary) for payslip in self])
+        for payslip, amount in zip(self, amounts):
+            payslip.paye_tax = amount
     
-    @api.depends('basic_salary')
+    @api.depends('basic_salary', 'company_id', 'date_to')
     def _compute_statutory(self):
-        for payslip in self:
-            # NSSF: 5% of basic salary (employee contribution)
-            payslip.nssf_deduction = payslip.basic_salary * 0.05 if payslip.basic_salary > 0 else 0
-            
-            # NHIF: Tiered based on basic salary
-            basic = payslip.basic_salary
-            if basic <= 5999:
-                payslip.nhif_deduction = 150
-            elif basic <= 7999:
-                payslip.nhif_deduction = 300
-            elif basic <= 11999:
-                payslip.nhif_deduction = 400
-            elif basic <= 14999:
-                payslip.nhif_deduction = 500
-            elif basic <= 19999:
-                payslip.nhif_deduction = 600
-            elif basic <= 24999:
-                payslip.nhif_deduction = 750
-            elif basic <= 29999:
-                payslip.nhif_deduction = 850
-            elif basic <= 34999:
-                payslip.nhif_deduction = 900
-            elif basic <= 39999:
-                payslip.nhif_deduction = 950
-            elif basic <= 44999:
-                payslip.nhif_deduction = 1000
-            elif basic <= 49999:
-                payslip.nhif_deduction = 1100
-            elif basic <= 59999:
-                payslip.nhif_deduction = 1200
-            elif basic <= 69999:
-                payslip.nhif_deduction = 1300
-            elif basic <= 79999:
-                payslip.nhif_deduction = 1400
-            elif basic <= 89999:
-                payslip.nhif_deduction = 1500
-            elif basic <= 99999:
-                payslip.nhif_deduction = 1600
-            else:
-                payslip.nhif_deduction = 1700
+        amounts = self.env['custom_payroll.tax_bracket_table']._get_amounts('nhif', [
+            (payslip.company_id.id, payslip.date_to, payslip.basic_salary) for payslip in self])
+        for payslip, amount in zip(self, amounts):
+            payslip.nssf_deduction = self._get_nssf_amount(payslip.basic_salary)
+            payslip.nhif_deduction = amount
     
     @api.model
-    def create(self, vals):
-        if vals.get('name', 'New') == 'New':
-            vals['name'] = self.env['ir.sequence'].next_by_code('custom_payroll.payslip') or 'New'
-        return super().create(vals)
+    def _get_nssf_amount(self, basic):
+        # NSSF: 5% of basic salary (employee contribution)
+        return basic * 0.05 if basic > 0 else 0
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get('name', 'New') == 'New':
+                vals['name'] = self.env['ir.sequence'].next_by_code('custom_payroll.payslip') or 'New'
+        return super().create(vals_list)
     
     def action_verify(self):
         self.write({'state': 'verified'})
@@ -151,112 +112,146 @@ class CustomPayrollPayslip(models.Model):
     def action_pay(self):
         self._create_accounting_entry()
         self.write({'state': 'paid', 'date_payment': fields.Date.today()})
+        self.loan_installment_ids.action_mark_as_paid()
     
     def action_cancel(self):
         self.write({'state': 'cancelled'})
+        # Release the installments so that the next payslip deducts them
+        self.loan_installment_ids.write({'payslip_id': False})
     
     def action_compute_sheet(self):
         """Compute the payslip lines based on salary rules"""
+        # Clear existing lines
+        self.line_ids.unlink()
+        
+        Installment = self.env['custom_payroll.loan_installment']
+        items = []
         for payslip in self:
-            # Clear existing lines
-            payslip.line_ids.unlink()
-            
-            # Get salary rules from structure
-            rules = payslip.salary_structure_id.rule_ids
-            lines = []
-            
-            # Add basic salary
-            lines.append((0, 0, {
-                'name': 'Basic Salary',
-                'code': 'BASIC',
-                'category': 'allowance',
-                'amount': payslip.contract_id.wage,
-                'quantity': 1,
-                'rate': 100,
-            }))
-            
-            # Add allowances from contract
-            lines.append((0, 0, {
-                'name': 'Housing Allowance',
-                'code': 'HOUSE',
-                'category': 'allowance',
-                'amount': payslip.contract_id.housing_allowance,
-                'quantity': 1,
-                'rate': 100,
-            }))
-            
-            lines.append((0, 0, {
-                'name': 'Transport Allowance',
-                'code': 'TRANS',
-                'category': 'allowance',
-                'amount': payslip.contract_id.transport_allowance,
-                'quantity': 1,
-                'rate': 100,
-            }))
-            
-            # Add statutory deductions
-            lines.append((0, 0, {
-                'name': 'PAYE Tax',
-                'code': 'PAYE',
-                'category': 'deduction',
-                'amount': payslip.paye_tax,
-                'quantity': 1,
-                'rate': 100,
-            }))
-            
-            lines.append((0, 0, {
-                'name': 'NSSF Contribution',
-                'code': 'NSSF',
-                'category': 'deduction',
-                'amount': payslip.nssf_deduction,
-                'quantity': 1,
-                'rate': 100,
-            }))
-            
-            lines.append((0, 0, {
-                'name': 'NHIF Contribution',
-                'code': 'NHIF',
-                'category': 'deduction',
-                'amount': payslip.nhif_deduction,
-                'quantity': 1,
-                'rate': 100,
-            }))
-            
-            # Add totals
-            lines.append((0, 0, {
-                'name': 'Gross Salary',
-                'code': 'GROSS',
-                'category': 'total',
-                'amount': payslip.gross_salary,
-                'quantity': 1,
-                'rate': 100,
-            }))
-            
-            lines.append((0, 0, {
-                'name': 'Total Deductions',
-                'code': 'DEDUCT',
-                'category': 'total',
-                'amount': payslip.total_deductions,
-                'quantity': 1,
-                'rate': 100,
-            }))
-            
-            lines.append((0, 0, {
-                'name': 'Net Salary',
-                'code': 'NET',
-                'category': 'total',
-                'amount': payslip.net_salary,
+            worked_amounts = {}
+            for worked_days in payslip.worked_days_ids:
+                worked_amounts[worked_days.code] = worked_amounts.get(worked_days.code, 0) + worked_days.amount
+            deductions = Installment._prepare_deductions(payslip.loan_installment_ids)
+            items.append((payslip.contract_id, payslip.company_id.id, payslip.date_to, worked_amounts, deductions))
+        lines_list = self._prepare_lines_batch(items)
+        self.env['custom_payroll.payslip_line'].create([
+            dict(vals, slip_id=payslip.id)
+            for payslip, lines in zip(self, lines_list)
+            for vals in lines
+        ])
+    
+    @api.model
+    def _prepare_lines_batch(self, items):
+        """Return the values of the payslip lines of many contracts.
+
+        The amounts are computed in memory with the same rules as the stored
+        totals, so that the lines can be created together with their payslip
+        without reading the totals back; the taxes of all the contracts are
+        looked up in their bracket tables at once.
+
+        Contracts paid by the hour or by the day get the amount of their
+        normal worked days as basic salary; overtime, holiday and weekend
+        work are added as allowances, loan repayments as deductions. The
+        salary rules of the contract's structure add their lines, replacing
+        the default lines of the same code.
+
+        :param items: list of (contract, company_id, date_to, worked_amounts,
+            deductions) where worked_amounts is {worked days code: amount}
+            and deductions a list of other deductions (name, code, amount)
+        :returns: list of lists of line values, in the order of items
+        """
+        def line(name, code, category, amount):
+            return {
+                'name': name,
+                'code': code,
+                'category': category,
+                'amount': amount,
                 'quantity': 1,
                 'rate': 100,
-            }))
+            }
+        
+        allowances_list, grosses = [], []
+        for contract, company_id, date_to, worked_amounts, _deductions in items:
+            basic_salary = contract.wage
+            if contract.wage_type != 'monthly' and worked_amounts:
+                basic_salary = worked_amounts.get('WORK100', 0) + worked_amounts.get('WORK50', 0)
+            allowances = [
+                line('Basic Salary', 'BASIC', 'allowance', basic_salary),
+                line('Housing Allowance', 'HOUSE', 'allowance', contract.housing_allowance),
+                line('Transport Allowance', 'TRANS', 'allowance', contract.transport_allowance),
+            ]
+            for code, name in (('OVERTIME', 'Overtime'), ('HOLIDAY', 'Public Holiday Work'), ('WEEKEND', 'Weekend Work')):
+                if worked_amounts.get(code):
+                    allowances.append(line(name, code, 'allowance', worked_amounts[code]))
+            allowances_list.append(allowances)
+            grosses.append(basic_salary + sum(vals['amount'] for vals in allowances))
+        
+        # Lines of the salary rules of the structures, evaluated once per
+        # structure for all its contracts; they replace the default lines
+        # of the same code
+        contracts = self.env['custom_payroll.contract'].concat(*(item[0] for item in items))
+        gross_salaries = {item[0].id: gross for item, gross in zip(items, grosses)}
+        rule_lines = {}
+        for structure in contracts.salary_structure_id.filtered('rule_ids'):
+            rule_lines.update(structure.compute_salary_batch(
+                contracts.filtered(lambda c: c.salary_structure_id == structure),
+                gross_salaries=gross_salaries))
+        
+        basics, rule_deductions_list = [], []
+        for index, item in enumerate(items):
+            lines = rule_lines.get(item[0].id, [])
+            codes = {vals['code'] for vals in lines}
+            allowances = [vals for vals in allowances_list[index] if vals['code'] not in codes]
+            allowances += [vals for vals in lines if vals['category'] == 'allowance']
+            allowances_list[index] = allowances
+            rule_deductions_list.append([vals for vals in lines if vals['category'] == 'deduction'])
             
-            payslip.line_ids = lines
+            # Same totals as _compute_totals
+            basic_salary = sum(vals['amount'] for vals in allowances if vals['code'] == 'BASIC')
+            basics.append(basic_salary)
+            grosses[index] = basic_salary + sum(vals['amount'] for vals in allowances)
+        
+        Brackets = self.env['custom_payroll.tax_bracket_table']
+        paye_amounts = Brackets._get_amounts('paye', [
+            (item[1], item[2], gross) for item, gross in zip(items, grosses)])
+        nhif_amounts = Brackets._get_amounts('nhif', [
+            (item[1], item[2], basic) for item, basic in zip(items, basics)])
+        
+        lines_list = []
+        for item, allowances, rule_deductions, basic_salary, gross_salary, paye, nhif in zip(
+                items, allowances_list, rule_deductions_list, basics, grosses, paye_amounts, nhif_amounts):
+            nssf = self._get_nssf_amount(basic_salary)
+            codes = {vals['code'] for vals in rule_deductions}
+            deductions = [vals for vals in [
+                # Add statutory deductions
+                line('PAYE Tax', 'PAYE', 'deduction', paye),
+                line('NSSF Contribution', 'NSSF', 'deduction', nssf),
+                line('NHIF Contribution', 'NHIF', 'deduction', nhif),
+            ] if vals['code'] not in codes] + rule_deductions
+            deductions += [line(name, code, 'deduction', amount) for name, code, amount in item[4]]
+            total_deductions = sum(vals['amount'] for vals in deductions)
+            lines_list.append(allowances + deductions + [
+                # Add totals
+                line('Gross Salary', 'GROSS', 'total', gross_salary),
+                line('Total Deductions', 'DEDUCT', 'total', total_deductions),
+                line('Net Salary', 'NET', 'total', gross_salary - total_deductions),
+            ])
+        return lines_list
     
     def _create_accounting_entry(self):
-        """Create accounting journal entry for the payslip"""
-        # This should integrate with your custom_accounting module
-        # For now, it's a placeholder
-        pass
+        """Create accounting journal entry for the payslips
+
+        Payslips already posted with their batch are skipped, the others get
+        one consolidated entry per company and payment date.
+        """
+        payslips = self.filtered(lambda p: not p.journal_entry_id)
+        groups = {}
+        for payslip in payslips:
+            groups.setdefault((payslip.company_id, payslip.date_payment or fields.Date.today()), []).append(payslip.id)
+        for (company, date), payslip_ids in groups.items():
+            slips = self.browse(payslip_ids)
+            ref = slips.name if len(slips) == 1 else f'Payslips {date}'
+            move = self._create_payslips_move(slips, date, f'Salary: {ref}')
+            slips.write({'journal_entry_id': move.id})
     
     def action_print_payslip(self):
         return self.env.ref('custom_payroll.report_payslip').report_action(self)
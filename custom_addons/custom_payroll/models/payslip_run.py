@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import split_every
 from datetime import datetime, timedelta
 
 class CustomPayrollPayslipRun(models.Model):
     _name = 'custom_payroll.payslip_run'
     _description = 'Payslip Batch'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'payroll.account.mixin']
     _order = 'date_start desc'
     
     name = fields.Char(string='Batch Name', required=True, default='New')
@@ -35,6 +36,9 @@ class CustomPayrollPayslipRun(models.Model):
     journal_entry_id = fields.Many2one('custom_accounting.move', string='Journal Entry')
     notes = fields.Text(string='Notes')
     
+    # number of payslips created at once by action_generate_payslips
+    _generate_batch_size = 500
+    
     @api.depends('payslip_ids', 'payslip_ids.basic_salary', 'payslip_ids.gross_salary',
                 'payslip_ids.total_deductions', 'payslip_ids.net_salary')
     def _compute_totals(self):
@@ -65,37 +69,82 @@ class CustomPayrollPayslipRun(models.Model):
         self.write({'state': 'cancelled'})
     
     def action_generate_payslips(self):
-        """Generate payslips for all active employees"""
+        """Generate payslips for all active employees
+
+        Employees and contracts are read once, the validated work entries of
+        the period are aggregated into worked days with one grouped query,
+        the loan installments due are read with one search and deducted,
+        the payslip lines are computed in memory and the payslips are
+        created together with their lines and worked days,
+        ``_generate_batch_size`` at a time, so that the stored totals are
+        computed once per payslip.
+        """
+        self.ensure_one()
+        Payslip = self.env['custom_payroll.payslip'].with_context(tracking_disable=True)
         active_employees = self.env['custom_payroll.employee'].search([
             ('payroll_active', '=', True),
             ('active_contract_id', '!=', False),
         ])
+        active_employees.active_contract_id.fetch(['wage', 'wage_type', 'working_hours', 'working_days',
+                                                   'hourly_wage', 'housing_allowance', 'transport_allowance'])
         
-        payslips = []
+        company = self.company_id or self.env.company
+        worked_days = self.env['custom_payroll.worked_days']._prepare_from_work_entries(
+            active_employees.active_contract_id, self.date_start, self.date_end)
+        Installment = self.env['custom_payroll.loan_installment']
+        installments = Installment._get_due_installments(active_employees, self.date_end)
+        items = []
         for employee in active_employees:
-            payslip = self.env['custom_payroll.payslip'].create({
+            worked_amounts = {}
+            for values, amount in worked_days.get(employee.active_contract_id.id, []):
+                worked_amounts[values['code']] = worked_amounts.get(values['code'], 0) + amount
+            deductions = Installment._prepare_deductions(installments.get(employee.id, Installment))
+            items.append((employee.active_contract_id, company.id, self.date_end, worked_amounts, deductions))
+        lines_list = Payslip._prepare_lines_batch(items)
+        
+        vals_list = []
+        for employee, lines in zip(active_employees, lines_list):
+            vals_list.append({
                 'employee_id': employee.id,
                 'contract_id': employee.active_contract_id.id,
                 'date_from': self.date_start,
                 'date_to': self.date_end,
                 'date_payment': self.date_payment,
                 'payslip_run_id': self.id,
+                'company_id': company.id,
+                'line_ids': [(0, 0, vals) for vals in lines],
+                'worked_days_ids': [(0, 0, values) for values, amount in
+                                    worked_days.get(employee.active_contract_id.id, [])],
             })
-            payslip.action_compute_sheet()
-            payslips.append(payslip.id)
+        
+        payslips = Payslip.browse()
+        for batch in split_every(self._generate_batch_size, vals_list, list):
+            payslips |= Payslip.create(batch)
+        self.env['custom_payroll.work_entry']._attach_to_payslips(payslips)
+        Installment.concat(*installments.values())._attach_to_payslips(payslips)
         
         return {
             'type': 'ir.actions.act_window',
             'name': 'Generated Payslips',
             'res_model': 'custom_payroll.payslip',
             'view_mode': 'tree,form',
-            'domain': [('id', 'in', payslips)],
+            'domain': [('id', 'in', payslips.ids)],
         }
     
     def _create_batch_accounting_entry(self):
-        """Create accounting journal entry for the entire batch"""
-        # This should integrate with your custom_accounting module
-        pass
+        """Create accounting journal entry for the entire batch
+
+        One entry per batch, with its lines summed by account over all the
+        payslips, instead of one entry per payslip.
+        """
+        for batch in self.filtered(lambda b: not b.journal_entry_id):
+            payslips = batch.payslip_ids.filtered(lambda p: p.state != 'cancelled' and not p.journal_entry_id)
+            if not payslips:
+                continue
+            move = self._create_payslips_move(payslips, batch.date_payment or fields.Date.today(),
+                                              f'Payroll: {batch.name}')
+            batch.journal_entry_id = move
+            payslips.write({'journal_entry_id': move.id})
     
     def action_print_summary(self):
         return self.env.ref('custom_payroll.report_payroll_summary').report_action(self)
@@ -1,6 +1,13 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
-from odoo.exceptions import ValidationError
+import logging
+import time
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import ValidationError, UserError
+from odoo.tools.safe_eval import _BUILTINS, _SAFE_OPCODES, test_expr, unsafe_eval
+
+_logger = logging.getLogger(__name__)
+
 
 class CustomPayrollSalaryRule(models.Model):
     _name = 'custom_payroll.salary_rule'
@@ -37,7 +44,10 @@ class CustomPayrollSalaryRule(models.Model):
         ('python', 'Python Expression'),
     ], string='Condition Based On', default='none')
     
-    condition_range = fields.Char(string='Range')
+    condition_range = fields.Char(string='Range', default='contract.wage',
+                                  help='Expression whose value must lie between the range minimum and maximum')
+    condition_range_min = fields.Float(string='Range Minimum')
+    condition_range_max = fields.Float(string='Range Maximum')
     condition_python = fields.Text(string='Python Condition')
     
     # Applies to
@@ -68,45 +78,186 @@ class CustomPayrollSalaryRule(models.Model):
         ('code_company_uniq', 'unique(code, company_id)', 'Code must be unique per company!'),
     ]
     
-    def compute_rule(self, employee, contract, basic_salary, gross_salary):
-        """Compute the amount for this rule"""
-        amount = 0
-        
-        # Check conditions
-        if not self._check_conditions(employee):
-            return 0
-        
-        # Compute based on amount type
-        if self.amount_type == 'fixed':
-            amount = self.amount
-        elif self.amount_type == 'percentage':
-            amount = basic_salary * (self.amount / 100)
-        elif self.amount_type == 'percentage_gross':
-            amount = gross_salary * (self.amount / 100)
-        elif self.amount_type == 'formula' and self.amount_formula:
-            # Simple formula evaluation (in real implementation, use safe_eval)
+    @api.constrains('amount_type', 'amount_formula', 'condition_select', 'condition_range', 'condition_python')
+    def _check_expressions(self):
+        for rule in self:
+            try:
+                rule._compile()
+            except (SyntaxError, ValueError, NameError) as e:
+                raise ValidationError(_('Invalid expression on salary rule %s: %s') % (rule.name, e))
+    
+    def _compile(self):
+        """Compile the formula and condition of the rule with the opcodes
+        allowed by safe_eval.
+
+        Returns a dict with the code objects ('amount', 'condition' and
+        'range', None when not used) and the names they read ('names').
+        """
+        self.ensure_one()
+        return self._compile_expressions(self.amount_type, self.amount_formula, self.condition_select,
+                                         self.condition_range, self.condition_python)
+    
+    # safe_eval checks and evaluates an expression in a single call, while
+    # the rules are checked once and evaluated for every contract: its
+    # internals (test_expr, _SAFE_OPCODES, _BUILTINS) are only used by the
+    # two methods below, to be adapted if safe_eval changes
+    
+    @api.model
+    def _compile_expression(self, expression, mode):
+        """Return the code object of expression, checked like safe_eval does"""
+        return test_expr(expression.strip(), _SAFE_OPCODES, mode=mode)
+    
+    @api.model
+    def _get_localdict(self, **values):
+        """Evaluation context of the compiled rules, with the builtins
+        safe_eval allows"""
+        return dict(values, __builtins__=dict(_BUILTINS))
+    
+    @api.model
+    @tools.ormcache('amount_type', 'amount_formula', 'condition_select', 'condition_range', 'condition_python')
+    def _compile_expressions(self, amount_type, amount_formula, condition_select, condition_range, condition_python):
+        # Keyed on the expressions, a modified rule is compiled again
+        compiled = {'amount': None, 'condition': None, 'range': None}
+        if amount_type == 'formula' and amount_formula:
+            compiled['amount'] = self._compile_expression(amount_formula, 'eval')
+        if condition_select == 'range' and condition_range:
+            compiled['range'] = self._compile_expression(condition_range, 'eval')
+        elif condition_select == 'python' and condition_python:
+            # Either an expression, or statements assigning 'result'
             try:
-                amount = eval(self.amount_formula, {
-                    'basic': basic_salary,
-                    'gross': gross_salary,
-                    'contract': contract,
-                    'employee': employee,
-                })
-            except:
-                amount = 0
+                compiled['condition'] = self._compile_expression(condition_python, 'eval')
+            except SyntaxError:
+                compiled['condition'] = self._compile_expression(condition_python, 'exec')
+        compiled['names'] = frozenset(
+            name for code in compiled.values() if code for name in code.co_names)
+        return compiled
+    
+    def _get_evaluation_order(self):
+        """Return the rules ordered so that the rules referenced by a formula
+        or a condition (through their code) are evaluated before it."""
+        by_code = {rule.code: rule for rule in self}
+        ordered, visiting, done = [], set(), set()
+        
+        def visit(rule):
+            if rule.id in done:
+                return
+            if rule.id in visiting:
+                raise UserError(_('Salary rule %s depends on itself through its formula or condition.') % rule.name)
+            visiting.add(rule.id)
+            names = rule._compile()['names']
+            for code in sorted(names & by_code.keys()):
+                visit(by_code[code])
+            visiting.discard(rule.id)
+            done.add(rule.id)
+            ordered.append(rule)
         
-        return amount
+        for rule in self.sorted(lambda r: (r.sequence, r.code)):
+            visit(rule)
+        return ordered
     
-    def _check_conditions(self, employee):
+    def _compute_rules_batch(self, contracts, gross_salaries=None):
+        """Compute the rules of self for a batch of contracts.
+
+        Each rule is compiled once (the compiled code is cached per
+        expression) and the rules are evaluated in dependency order; a
+        formula or condition can use basic, gross, contract, employee, the
+        amount of the rules evaluated before it through their code, and
+        the dict 'rules' of those amounts.
+
+        :param contracts: custom_payroll.contract records
+        :param gross_salaries: {contract_id: gross salary}, 0 if missing
+        :returns: tuple (amounts, timings) where amounts is
+            {contract_id: {rule_id: amount}} and timings gives the time
+            spent evaluating each rule, {rule_id: seconds}
+        """
+        gross_salaries = gross_salaries or {}
+        rules = self._get_evaluation_order()
+        compiled = {rule.id: rule._compile() for rule in rules}
+        timings = dict.fromkeys(compiled, 0.0)
+        amounts = {}
+        for contract in contracts:
+            amounts_by_code = {}
+            localdict = self._get_localdict(
+                basic=contract.wage,
+                gross=gross_salaries.get(contract.id, 0),
+                contract=contract,
+                employee=contract.employee_id,
+                rules=amounts_by_code,
+            )
+            contract_amounts = amounts[contract.id] = {}
+            for rule in rules:
+                start = time.perf_counter()
+                amount = rule._evaluate(compiled[rule.id], localdict)
+                timings[rule.id] += time.perf_counter() - start
+                contract_amounts[rule.id] = amount
+                amounts_by_code[rule.code] = amount
+                localdict[rule.code] = amount
+        if _logger.isEnabledFor(logging.DEBUG):
+            for rule in rules:
+                _logger.debug('Salary rule %s evaluated for %s contracts in %.3fs',
+                              rule.code, len(contracts), timings[rule.id])
+        return amounts, timings
+    
+    def _evaluate(self, compiled, localdict):
+        """Evaluate the compiled rule in localdict (see _compute_rules_batch)"""
+        self.ensure_one()
+        employee = localdict['employee']
+        try:
+            if not self._check_conditions(employee, compiled, localdict):
+                return 0
+            
+            # Compute based on amount type
+            if self.amount_type == 'fixed':
+                return self.amount
+            elif self.amount_type == 'percentage':
+                return localdict['basic'] * (self.amount / 100)
+            elif self.amount_type == 'percentage_gross':
+                return localdict['gross'] * (self.amount / 100)
+            elif compiled['amount']:
+                return float(unsafe_eval(compiled['amount'], localdict) or 0)
+        except UserError:
+            raise
+        except Exception as e:
+            raise UserError(_('Wrong formula or condition for salary rule %s (%s) and employee %s: %s')
+                            % (self.name, self.code, employee.name, e))
+        return 0
+    
+    def compute_rule(self, employee, contract, basic_salary, gross_salary):
+        """Compute the amount for this rule"""
+        self.ensure_one()
+        localdict = self._get_localdict(
+            basic=basic_salary,
+            gross=gross_salary,
+            contract=contract,
+            employee=employee,
+            rules={},
+        )
+        return self._evaluate(self._compile(), localdict)
+    
+    def _check_conditions(self, employee, compiled=None, localdict=None):
         """Check if rule applies to this employee"""
-        if self.condition_select == 'none':
-            return True
-        elif self.condition_select == 'range':
-            # Implement range checking
-            return True
-        elif self.condition_select == 'python':
-            # Implement Python condition checking
-            return True
+        if compiled is None:
+            compiled = self._compile()
+        if localdict is None:
+            localdict = self._get_localdict(
+                employee=employee,
+                contract=employee.active_contract_id,
+                basic=employee.active_contract_id.wage,
+                gross=0,
+                rules={},
+            )
+        
+        if self.condition_select == 'range' and compiled['range']:
+            value = unsafe_eval(compiled['range'], localdict)
+            if not self.condition_range_min <= value <= self.condition_range_max:
+                return False
+        elif self.condition_select == 'python' and compiled['condition']:
+            result = unsafe_eval(compiled['condition'], localdict)
+            if 'result' in localdict:
+                # Statements assign their outcome to 'result'
+                result = localdict.pop('result')
+            if not result:
+                return False
         
         # Check applies_to conditions
         if self.applies_to == 'all':
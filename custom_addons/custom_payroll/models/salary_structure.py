@@ -46,25 +46,35 @@ class CustomPayrollSalaryStructure(models.Model):
     
     def compute_salary(self, employee, contract, period_start, period_end):
         """Compute salary for an employee using this structure"""
-        lines = []
-        
-        # Get basic salary from contract
-        basic_salary = contract.wage
+        return self.compute_salary_batch(contract, period_start, period_end)[contract.id]
+    
+    def compute_salary_batch(self, contracts, period_start=None, period_end=None, gross_salaries=None):
+        """Compute salary for a batch of contracts using this structure
+
+        The rules are compiled once for the whole batch, see
+        custom_payroll.salary_rule._compute_rules_batch. Returns the
+        lines of each contract, {contract_id: [line values]}.
+        """
+        self.ensure_one()
+        amounts, _timings = self.rule_ids._compute_rules_batch(contracts, gross_salaries)
+        rules = self.rule_ids.sorted(lambda r: (r.sequence, r.code))
         
-        # Compute each rule
-        for rule in self.rule_ids:
-            amount = rule.compute_rule(employee, contract, basic_salary, 0)
-            if amount != 0:
-                lines.append({
-                    'name': rule.name,
-                    'code': rule.code,
-                    'category': 'allowance' if rule.rule_type == 'allowance' else 'deduction',
-                    'amount': amount,
-                    'quantity': 1,
-                    'rate': 100,
-                    'salary_rule_id': rule.id,
-                    'account_debit': rule.account_debit.id if rule.account_debit else False,
-                    'account_credit': rule.account_credit.id if rule.account_credit else False,
-                })
+        result = {}
+        for contract in contracts:
+            lines = result[contract.id] = []
+            for rule in rules:
+                amount = amounts[contract.id][rule.id]
+                if amount != 0:
+                    lines.append({
+                        'name': rule.name,
+                        'code': rule.code,
+                        'category': 'allowance' if rule.rule_type == 'allowance' else 'deduction',
+                        'amount': amount,
+                        'quantity': 1,
+                        'rate': 100,
+                        'salary_rule_id': rule.id,
+                        'account_debit': rule.account_debit.id if rule.account_debit else False,
+                        'account_credit': rule.account_credit.id if rule.account_credit else False,
+                    })
         
-        return lines
+        return result
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_left, bisect_right
+
+from odoo import models, fields, api
+
+
+class CustomPayrollTaxBracketTable(models.Model):
+    _name = 'custom_payroll.tax_bracket_table'
+    _description = 'Tax Bracket Table'
+    _order = 'code, date_from desc'
+    
+    name = fields.Char(string='Name', required=True)
+    code = fields.Selection([
+        ('paye', 'PAYE Tax'),
+        ('nhif', 'NHIF'),
+    ], string='Applies To', required=True)
+    method = fields.Selection([
+        ('progressive', 'Progressive (rate on the part within each bracket)'),
+        ('flat', 'Flat (amount of the bracket reached)'),
+    ], string='Method', required=True, default='progressive')
+    date_from = fields.Date(string='Effective From', required=True)
+    bracket_ids = fields.One2many('custom_payroll.tax_bracket', 'table_id', string='Brackets', copy=True)
+    
+    # Status
+    active = fields.Boolean(string='Active', default=True)
+    company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company,
+                                 help='Leave empty to apply the table to all companies')
+    
+    _sql_constraints = [
+        ('code_date_company_uniq', 'unique(code, date_from, company_id)',
+         'Only one table per type, effective date and company is allowed!'),
+    ]
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        tables = super().create(vals_list)
+        self.env['custom_payroll.tax_bracket_table']._invalidate_tables()
+        return tables
+    
+    def write(self, vals):
+        res = super().write(vals)
+        self.env['custom_payroll.tax_bracket_table']._invalidate_tables()
+        return res
+    
+    def unlink(self):
+        res = super().unlink()
+        self.env['custom_payroll.tax_bracket_table']._invalidate_tables()
+        return res
+    
+    @api.model
+    def _invalidate_tables(self):
+        self.env.cr.cache.pop('custom_payroll_tax_bracket_tables', None)
+    
+    @api.model
+    def _get_tables(self, code):
+        """Return the active tables of a type, precomputed for lookups:
+        {company_id or False: (dates, tables)} where dates are sorted and
+        tables[i], effective from dates[i], is a tuple
+        (method, bounds, cumulative, rates, fixed amounts).
+        
+        The result is cached on the cursor for the duration of the request,
+        so that computing a payslip run reads the tables once.
+        """
+        cache = self.env.cr.cache.setdefault('custom_payroll_tax_bracket_tables', {})
+        if code not in cache:
+            cache[code] = self._compute_tables(code)
+        return cache[code]
+    
+    @api.model
+    def _compute_tables(self, code):
+        result = {}
+        for table in self.sudo().search([('code', '=', code)], order='date_from'):
+            brackets = table.bracket_ids.sorted('amount_from')
+            bounds = tuple(brackets.mapped('amount_from'))
+            rates = tuple(brackets.mapped('rate'))
+            # Tax due on the brackets below each bracket
+            cumulative = [0.0]
+            for i in range(1, len(bounds)):
+                cumulative.append(cumulative[-1] + (bounds[i] - bounds[i - 1]) * rates[i - 1] / 100)
+            dates, tables = result.setdefault(table.company_id.id, ([], []))
+            dates.append(table.date_from)
+            tables.append((table.method, bounds, tuple(cumulative), rates,
+                           tuple(brackets.mapped('fixed_amount'))))
+        return result
+    
+    @api.model
+    def _get_amounts(self, code, items):
+        """Compute the amounts of a type of table for many bases at once.
+
+        :param items: iterable of (company_id, date, base)
+        :returns: list of amounts, in the order of items; 0 when no table
+            is effective at the date
+        """
+        tables_by_company = self._get_tables(code)
+        today = fields.Date.context_today(self)
+        amounts = []
+        for company_id, date, base in items:
+            table = None
+            for key in (company_id, False):
+                if key not in tables_by_company:
+                    continue
+                dates, tables = tables_by_company[key]
+                index = bisect_right(dates, date or today) - 1
+                if index >= 0:
+                    table = tables[index]
+                    break
+            amounts.append(self._get_bracket_amount(table, base or 0.0))
+        return amounts
+    
+    @api.model
+    def _get_bracket_amount(self, table, base):
+        if not table or not table[1]:
+            return 0.0
+        method, bounds, cumulative, rates, fixed = table
+        # A bracket applies above its lower bound
+        index = max(bisect_left(bounds, base) - 1, 0)
+        if method == 'progressive':
+            return fixed[index] + cumulative[index] + (base - bounds[index]) * rates[index] / 100
+        return fixed[index] + base * rates[index] / 100
+    
+    def _get_affected_payslips(self):
+        """Payslips not confirmed yet whose period ends after the tables
+        became effective"""
+        domain = [
+            ('state', 'in', ('draft', 'verified')),
+            ('date_to', '>=', min(self.mapped('date_from'))),
+        ]
+        if all(table.company_id for table in self):
+            domain.append(('company_id', 'in', self.company_id.ids))
+        return self.env['custom_payroll.payslip'].search(domain)
+    
+    def action_recompute_payslips(self):
+        """Recompute the lines and taxes of the payslips affected by the tables"""
+        self._get_affected_payslips().action_compute_sheet()
+        return True
+
+
+class CustomPayrollTaxBracket(models.Model):
+    _name = 'custom_payroll.tax_bracket'
+    _description = 'Tax Bracket'
+    _order = 'table_id, amount_from'
+    
+    table_id = fields.Many2one('custom_payroll.tax_bracket_table', string='Table', required=True, ondelete='cascade')
+    amount_from = fields.Float(string='Above', required=True, default=0,
+                               help='The bracket applies to the amounts above this one')
+    rate = fields.Float(string='Rate (%)', default=0)
+    fixed_amount = fields.Float(string='Fixed Amount', default=0)
+    
+    _sql_constraints = [
+        ('amount_table_uniq', 'unique(table_id, amount_from)', 'Brackets of a table must start at different amounts!'),
+    ]
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        brackets = super().create(vals_list)
+        self.env['custom_payroll.tax_bracket_table']._invalidate_tables()
+        return brackets
+    
+    def write(self, vals):
+        res = super().write(vals)
+        self.env['custom_payroll.tax_bracket_table']._invalidate_tables()
+        return res
+    
+    def unlink(self):
+        res = super().unlink()
+        self.env['custom_payroll.tax_bracket_table']._invalidate_tables()
+        return res
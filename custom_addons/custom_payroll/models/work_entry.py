@@ -64,3 +64,23 @@ class CustomPayrollWorkEntry(models.Model):
     
     def action_cancel(self):
         self.write({'state': 'cancelled'})
+    
+    @api.model
+    def _attach_to_payslips(self, payslips):
+        """Link the validated work entries of the payslip periods to the
+        payslips of their contract, with one query"""
+        if not payslips:
+            return
+        self.flush_model(['contract_id', 'state', 'payslip_id', 'date'])
+        payslips.flush_recordset(['contract_id', 'date_from', 'date_to'])
+        self.env.cr.execute("""
+            UPDATE custom_payroll_work_entry we
+            SET payslip_id = p.id
+            FROM custom_payroll_payslip p
+            WHERE p.id IN %s
+                AND we.contract_id = p.contract_id
+                AND we.state = 'validated'
+                AND we.payslip_id IS NULL
+                AND we.date BETWEEN p.date_from AND p.date_to
+        """, [tuple(payslips.ids)])
+        self.invalidate_model(['payslip_id'])
@@ -1,5 +1,12 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api
+from odoo.tools import float_round
+
+# Worked days code of the work entries, by work entry type category
+WORK_ENTRY_CATEGORY_CODES = {
+    'overtime': 'OVERTIME',
+    'holiday': 'HOLIDAY',
+}
 
 class CustomPayrollWorkedDays(models.Model):
     _name = 'custom_payroll.worked_days'
@@ -15,6 +22,8 @@ class CustomPayrollWorkedDays(models.Model):
         ('HOLIDAY', 'Public Holiday'),
         ('WEEKEND', 'Weekend Work'),
     ], string='Work Code', required=True)
+    work_entry_type_id = fields.Many2one('custom_payroll.work.entry.type', string='Work Entry Type',
+                                         help='Set on the lines aggregated from the work entries')
     number_of_days = fields.Float(string='Number of Days', required=True, default=0)
     number_of_hours = fields.Float(string='Number of Hours', default=0)
     hourly_rate = fields.Float(string='Hourly Rate', compute='_compute_rates', store=True)
@@ -23,26 +32,84 @@ class CustomPayrollWorkedDays(models.Model):
     date_from = fields.Date(string='From Date', related='payslip_id.date_from', store=True)
     date_to = fields.Date(string='To Date', related='payslip_id.date_to', store=True)
     
-    @api.depends('employee_id', 'payslip_id.contract_id')
+    @api.depends('employee_id', 'payslip_id.contract_id', 'payslip_id.contract_id.wage',
+                 'payslip_id.contract_id.wage_type', 'payslip_id.contract_id.working_days',
+                 'payslip_id.contract_id.working_hours')
     def _compute_rates(self):
         for line in self:
-            contract = line.payslip_id.contract_id
-            if contract and contract.wage_type == 'monthly':
-                line.daily_rate = contract.wage / 22
-                line.hourly_rate = contract.hourly_wage
-            else:
-                line.daily_rate = 0
-                line.hourly_rate = 0
+            line.daily_rate, line.hourly_rate = self._get_rates(line.payslip_id.contract_id)
     
-    @api.depends('number_of_days', 'number_of_hours', 'daily_rate', 'hourly_rate', 'code')
+    @api.depends('number_of_days', 'number_of_hours', 'daily_rate', 'hourly_rate', 'code',
+                 'work_entry_type_id.rate', 'work_entry_type_id.is_paid')
     def _compute_amount(self):
         for line in self:
-            if line.code == 'OVERTIME':
-                line.amount = line.number_of_hours * line.hourly_rate * 1.5
-            elif line.code == 'HOLIDAY' or line.code == 'WEEKEND':
-                line.amount = line.number_of_days * line.daily_rate * 2
+            line.amount = self._get_amount(line.code, line.number_of_days, line.number_of_hours,
+                                           line.daily_rate, line.hourly_rate, line.work_entry_type_id)
+    
+    @api.model
+    def _get_rates(self, contract):
+        """Return the (daily rate, hourly rate) of a contract"""
+        if not contract:
+            return 0, 0
+        if contract.wage_type == 'monthly':
+            return contract.wage / (contract.working_days or 22), contract.hourly_wage
+        if contract.wage_type == 'daily':
+            return contract.wage, contract.wage / contract.working_hours if contract.working_hours else 0
+        return contract.wage * contract.working_hours, contract.wage
+    
+    @api.model
+    def _get_amount(self, code, number_of_days, number_of_hours, daily_rate, hourly_rate, work_entry_type=None):
+        if work_entry_type:
+            # Lines of the work entries: paid at the rate of their type
+            if not work_entry_type.is_paid:
+                return 0
+            if number_of_hours > 0:
+                return number_of_hours * hourly_rate * work_entry_type.rate / 100
+            return number_of_days * daily_rate * work_entry_type.rate / 100
+        if code == 'OVERTIME':
+            return number_of_hours * hourly_rate * 1.5
+        elif code == 'HOLIDAY' or code == 'WEEKEND':
+            return number_of_days * daily_rate * 2
+        else:
+            if number_of_hours > 0:
+                return number_of_hours * hourly_rate
             else:
-                if line.number_of_hours > 0:
-                    line.amount = line.number_of_hours * line.hourly_rate
-                else:
-                    line.amount = line.number_of_days * line.daily_rate
+                return number_of_days * daily_rate
+    
+    @api.model
+    def _prepare_from_work_entries(self, contracts, date_from, date_to):
+        """Aggregate the validated work entries of contracts over a period.
+
+        The entries not linked to a payslip yet are summed by employee,
+        contract and work entry type with one grouped query.
+
+        Returns the worked days of each contract with their amount computed
+        in memory, {contract_id: [(values, amount)]}.
+        """
+        groups = self.env['custom_payroll.work_entry']._read_group([
+            ('contract_id', 'in', contracts.ids),
+            ('state', '=', 'validated'),
+            ('payslip_id', '=', False),
+            ('date', '>=', date_from),
+            ('date', '<=', date_to),
+        ], ['employee_id', 'contract_id', 'work_entry_type_id'], ['duration:sum'])
+
+        result = {}
+        for _employee, contract, work_entry_type, hours in groups:
+            daily_rate, hourly_rate = self._get_rates(contract)
+            days = hours / contract.working_hours if contract.working_hours else 0
+            if work_entry_type.round_days == 'half':
+                days = float_round(days, precision_rounding=0.5)
+            elif work_entry_type.round_days == 'day':
+                days = float_round(days, precision_rounding=1)
+            code = WORK_ENTRY_CATEGORY_CODES.get(work_entry_type.category, 'WORK100')
+            values = {
+                'name': work_entry_type.name,
+                'code': code,
+                'work_entry_type_id': work_entry_type.id,
+                'number_of_days': days,
+                'number_of_hours': hours,
+            }
+            amount = self._get_amount(code, days, hours, daily_rate, hourly_rate, work_entry_type)
+            result.setdefault(contract.id, []).append((values, amount))
+        return result
@@ -25,18 +25,37 @@ odoo.define('custom_payroll.dashboard', function (require) {
         },
         
         _renderDashboard: function () {
-            // Fetch and render dashboard data
-            this._rpc({
+            var self = this;
+            // Fetch the last 12 months, then their breakdown by department;
+            // both are stored aggregates with stable ids
+            return this._rpc({
                 model: 'custom_payroll.payroll_dashboard',
                 method: 'search_read',
                 args: [[]],
                 kwargs: {
+                    fields: ['id', 'company_id', 'month', 'total_employees', 'total_payslips',
+                             'total_basic', 'total_gross', 'total_deductions', 'total_net', 'avg_salary'],
                     limit: 12,
-                    order: 'month DESC'
+                    order: 'month_date DESC'
                 }
-            }).then(function (data) {
-                // Process and display data
-                console.log('Dashboard data:', data);
+            }).then(function (months) {
+                return self._rpc({
+                    model: 'custom_payroll.payroll_dashboard_department',
+                    method: 'search_read',
+                    args: [[['dashboard_id', 'in', _.pluck(months, 'id')]]],
+                    kwargs: {
+                        fields: ['dashboard_id', 'department_id', 'total_employees', 'total_payslips',
+                                 'total_gross', 'total_deductions', 'total_net'],
+                    }
+                }).then(function (departments) {
+                    var departmentsByMonth = _.groupBy(departments, function (department) {
+                        return department.dashboard_id[0];
+                    });
+                    _.each(months, function (month) {
+                        month.departments = departmentsByMonth[month.id] || [];
+                    });
+                    self.months = months;
+                });
             });
         },
         
@@ -125,7 +125,10 @@ class AccountAssetAsset(models.Model):
     _description = 'Asset/Revenue Recognition'
     _inherit = ['mail.thread', 'mail.activity.mixin', 'analytic.mixin']
 
-    entry_count = fields.Integer(compute='_entry_count', string='# Asset Entries')
+    # number of depreciation lines created at once by _compute_depreciation_boards
+    _board_chunk_size = 5000
+
+    entry_count = fields.Integer(compute='_entry_count', string='# Asset Entries', store=True)
     name = fields.Char(string='Asset Name', required=True)
     code = fields.Char(string='Reference', size=32)
     value = fields.Monetary(string='Gross Value', required=True)
@@ -168,7 +171,7 @@ class AccountAssetAsset(models.Model):
     method_progress_factor = fields.Float(
         string='Degressive Factor', default=0.3
     )
-    value_residual = fields.Monetary(compute='_amount_residual', string='Residual Value')
+    value_residual = fields.Monetary(compute='_amount_residual', string='Residual Value', store=True)
     method_time = fields.Selection(
         [('number', 'Number of Entries'), ('end', 'Ending Date')],
         string='Time Method', required=True, default='number',
@@ -219,7 +222,9 @@ class AccountAssetAsset(models.Model):
 
     @api.model
     def _cron_generate_entries(self):
-        self.compute_generated_entries(datetime.today())
+        # commit the entries chunk by chunk: after a crash, the next run
+        # resumes with the depreciation lines not yet linked to an entry
+        self.with_context(asset_commit_chunks=True).compute_generated_entries(datetime.today())
 
     @api.model
     def compute_generated_entries(self, date, asset_type=None):
@@ -284,14 +289,16 @@ class AccountAssetAsset(models.Model):
             undone_dotation_number += 1
         return undone_dotation_number
 
-    def compute_depreciation_board(self):
+    def _get_depreciation_board_values(self):
+        """ Compute the unposted depreciation lines of the asset, without
+            writing anything.
+
+            :returns: the list of values of the depreciation lines to create
+        """
         self.ensure_one()
 
         posted_depreciation_line_ids = self.depreciation_line_ids.filtered(lambda x: x.move_check).sorted(key=lambda l: l.depreciation_date)
-        unposted_depreciation_line_ids = self.depreciation_line_ids.filtered(lambda x: not x.move_check)
-
-        # Remove old unposted depreciation lines. We cannot use unlink() with One2many field
-        commands = [(2, line_id.id, False) for line_id in unposted_depreciation_line_ids]
+        vals_list = []
 
         if self.value_residual != 0.0:
             amount_to_depr = residual_amount = self.value_residual
@@ -337,7 +344,7 @@ class AccountAssetAsset(models.Model):
                     'depreciated_value': self.value - (self.salvage_value + residual_amount),
                     'depreciation_date': depreciation_date,
                 }
-                commands.append((0, False, vals))
+                vals_list.append(vals)
 
                 depreciation_date = depreciation_date + relativedelta(months=+self.method_period)
 
@@ -350,10 +357,35 @@ class AccountAssetAsset(models.Model):
                     max_day_in_month = calendar.monthrange(depreciation_date.year, depreciation_date.month)[1]
                     depreciation_date = depreciation_date.replace(day=max_day_in_month)
 
+        return vals_list
+
+    def compute_depreciation_board(self):
+        self.ensure_one()
+
+        unposted_depreciation_line_ids = self.depreciation_line_ids.filtered(lambda x: not x.move_check)
+
+        # Remove old unposted depreciation lines. We cannot use unlink() with One2many field
+        commands = [(2, line_id.id, False) for line_id in unposted_depreciation_line_ids]
+        commands += [(0, False, vals) for vals in self._get_depreciation_board_values()]
         self.write({'depreciation_line_ids': commands})
 
         return True
 
+    def _compute_depreciation_boards(self):
+        """ Batch version of compute_depreciation_board: the schedules of all
+            the assets are computed in memory, then their unposted lines are
+            removed with one unlink and the new lines are created with one
+            create per chunk of ``_board_chunk_size`` lines.
+        """
+        vals_list = []
+        for asset in self:
+            vals_list += asset._get_depreciation_board_values()
+        self.depreciation_line_ids.filtered(lambda x: not x.move_check).unlink()
+        DepreciationLine = self.env['account.asset.depreciation.line']
+        for index in range(0, len(vals_list), self._board_chunk_size):
+            DepreciationLine.create(vals_list[index:index + self._board_chunk_size])
+        return True
+
     def validate(self):
         self.write({'state': 'open'})
         fields = [
@@ -460,9 +492,9 @@ class AccountAssetAsset(models.Model):
 
     @api.depends('depreciation_line_ids.move_id')
     def _entry_count(self):
+        # stored, only recomputed for the assets whose lines are (un)linked
         for asset in self:
-            res = self.env['account.asset.depreciation.line'].search_count([('asset_id', '=', asset.id), ('move_id', '!=', False)])
-            asset.entry_count = res or 0
+            asset.entry_count = len(asset.depreciation_line_ids.filtered('move_id'))
 
     @api.constrains('prorata', 'method_time')
     def _check_prorata(self):
@@ -517,15 +549,13 @@ class AccountAssetAsset(models.Model):
     @api.model_create_multi
     def create(self, vals_list):
         assets = super(AccountAssetAsset, self.with_context(mail_create_nolog=True)).create(vals_list)
-        for asset in assets:
-            asset.sudo().compute_depreciation_board()
+        assets.sudo()._compute_depreciation_boards()
         return assets
 
     def write(self, vals):
         res = super(AccountAssetAsset, self).write(vals)
         if 'depreciation_line_ids' not in vals and 'state' not in vals:
-            for rec in self:
-                rec.compute_depreciation_board()
+            self._compute_depreciation_boards()
         return res
 
     def open_entries(self):
@@ -549,6 +579,9 @@ class AccountAssetDepreciationLine(models.Model):
     _name = 'account.asset.depreciation.line'
     _description = 'Asset depreciation line'
 
+    # number of journal entries created at once by create_move
+    _move_chunk_size = 500
+
     name = fields.Char(string='Depreciation Name', required=True, index=True)
     sequence = fields.Integer(required=True)
     asset_id = fields.Many2one('account.asset.asset', string='Asset',
@@ -582,28 +615,54 @@ class AccountAssetDepreciationLine(models.Model):
             line.move_posted_check = True if line.move_id and line.move_id.state == 'posted' else False
 
     def create_move(self, post_move=True):
+        """ Create (and post) one journal entry per depreciation line.
+
+            The entries are created with one create per chunk of
+            ``_move_chunk_size`` lines, linked to their depreciation line by
+            that same create, and posted together. With the context key
+            'asset_commit_chunks' {Boolean} every chunk is committed, so that
+            an interrupted run only loses its current chunk: the lines already
+            linked to an entry are skipped by the next run.
+        """
+        if any(line.move_id for line in self):
+            raise UserError(_('This depreciation is already linked to a journal entry. Please post or delete it.'))
         created_moves = self.env['account.move']
-        for line in self:
-            if line.move_id:
-                raise UserError(_('This depreciation is already linked to a journal entry. Please post or delete it.'))
-            move_vals = self._prepare_move(line)
-            move = self.env['account.move'].create(move_vals)
-            line.write({'move_id': move.id, 'move_check': True})
-            created_moves |= move
-
-        if post_move and created_moves:
-            created_moves.filtered(lambda m: any(m.asset_depreciation_ids.mapped('asset_id.category_id.open_asset'))).action_post()
+        rates = {}
+        for index in range(0, len(self), self._move_chunk_size):
+            lines = self[index:index + self._move_chunk_size]
+            move_vals_list = []
+            for line in lines:
+                move_vals = self._prepare_move(line, rates=rates)
+                move_vals['asset_depreciation_ids'] = [(4, line.id)]
+                move_vals_list.append(move_vals)
+            moves = self.env['account.move'].create(move_vals_list)
+            if post_move:
+                moves.filtered(lambda m: any(m.asset_depreciation_ids.mapped('asset_id.category_id.open_asset'))).action_post()
+            created_moves |= moves
+            if self.env.context.get('asset_commit_chunks'):
+                self.env.cr.commit()
         return [x.id for x in created_moves]
 
-    def _prepare_move(self, line):
+    def _get_conversion_rate(self, from_currency, to_currency, company, date, rates=None):
+        """ Conversion rate between two currencies, memoized in ``rates``
+            by (currency, company, date) when it is given.
+        """
+        if rates is None:
+            return self.env['res.currency']._get_conversion_rate(from_currency, to_currency, company, date)
+        key = (from_currency.id, to_currency.id, company.id, date)
+        if key not in rates:
+            rates[key] = self.env['res.currency']._get_conversion_rate(from_currency, to_currency, company, date)
+        return rates[key]
+
+    def _prepare_move(self, line, rates=None):
         category_id = line.asset_id.category_id
         analytic_distribution = line.asset_id.analytic_distribution
         depreciation_date = self.env.context.get('depreciation_date') or line.depreciation_date or fields.Date.context_today(self)
         company_currency = line.asset_id.company_id.currency_id
         current_currency = line.asset_id.currency_id
         prec = company_currency.decimal_places
-        amount = current_currency._convert(
-            line.amount, company_currency, line.asset_id.company_id, depreciation_date)
+        amount = company_currency.round(line.amount * self._get_conversion_rate(
+            current_currency, company_currency, line.asset_id.company_id, depreciation_date, rates))
         asset_name = line.asset_id.name + ' (%s/%s)' % (line.sequence, len(line.asset_id.depreciation_line_ids))
         move_line_1 = {
             'name': asset_name,
@@ -642,12 +701,14 @@ class AccountAssetDepreciationLine(models.Model):
 
         depreciation_date = self.env.context.get('depreciation_date') or fields.Date.context_today(self)
         amount = 0.0
+        rates = {}
         for line in self:
             # Sum amount of all depreciation lines
             company_currency = line.asset_id.company_id.currency_id
             current_currency = line.asset_id.currency_id
             company = line.asset_id.company_id
-            amount += current_currency._convert(line.amount, company_currency, company, fields.Date.today())
+            amount += company_currency.round(line.amount * self._get_conversion_rate(
+                current_currency, company_currency, company, fields.Date.today(), rates))
 
         name = category_id.name + _(' (grouped)')
         move_line_1 = {
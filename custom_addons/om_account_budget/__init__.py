@@ -1 +1,11 @@
 from . import models
+
+
+def uninstall_hook(env):
+    # the queue triggers would otherwise keep running on every journal item
+    env.cr.execute("""
+        DROP TRIGGER IF EXISTS crossovered_budget_snapshot_enqueue ON account_move_line;
+        DROP TRIGGER IF EXISTS crossovered_budget_snapshot_enqueue ON account_analytic_line;
+        DROP FUNCTION IF EXISTS crossovered_budget_snapshot_enqueue();
+        DROP TABLE IF EXISTS crossovered_budget_snapshot_queue;
+    """)
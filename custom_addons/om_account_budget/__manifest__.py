@@ -12,10 +12,12 @@
     'data': [
         'security/ir.model.access.csv',
         'security/security.xml',
+        'data/account_budget_data.xml',
         'views/account_analytic_account_views.xml',
         'views/account_budget_views.xml',
         'views/res_config_settings_views.xml',
     ],
     'images': ['static/description/banner.gif'],
     'demo': ['data/account_budget_demo.xml'],
+    'uninstall_hook': 'uninstall_hook',
 }
@@ -1,4 +1,5 @@
-from odoo import api, fields, models, _
+from collections import defaultdict
+from odoo import api, fields, models, tools, _
 from odoo.exceptions import ValidationError
 
 
@@ -32,7 +33,11 @@ class AccountBudgetPost(models.Model):
 
     def write(self, vals):
         self._check_account_ids(vals)
-        return super(AccountBudgetPost, self).write(vals)
+        res = super(AccountBudgetPost, self).write(vals)
+        if 'account_ids' in vals:
+            self.env['crossovered.budget.lines'].search(
+                [('general_budget_id', 'in', self.ids)])._reset_snapshot()
+        return res
 
 
 class CrossoveredBudget(models.Model):
@@ -101,43 +106,61 @@ class CrossoveredBudgetLines(models.Model):
         string='Company', store=True, readonly=True)
     is_above_budget = fields.Boolean(compute='_is_above_budget')
     crossovered_budget_state = fields.Selection(related='crossovered_budget_id.state', string='Budget State', store=True, readonly=True)
+    snapshot_practical_amount = fields.Monetary(
+        'Practical Amount (Snapshot)', readonly=True, copy=False,
+        help="Practical amount as of the last refresh of the budget actuals.")
+    snapshot_date = fields.Datetime(
+        'Actuals Refreshed On', readonly=True, copy=False,
+        help="Last refresh of the snapshot of the practical amount. Budget analyses read the "
+             "snapshot instead of recomputing the practical amounts.")
 
     @api.model
     def read_group(self, domain, fields, groupby, offset=0, limit=None, orderby=False, lazy=True):
         # overrides the default read_group in order to compute the computed fields manually for the group
         fields_list = {'practical_amount', 'theoritical_amount', 'percentage'}
         fields = {field.split(':', 1)[0] if field.split(':', 1)[0] in fields_list else field for field in fields}
-        result = super(CrossoveredBudgetLines, self).read_group(domain, fields, groupby, offset=offset, limit=limit,
-                                                                orderby=orderby, lazy=lazy)
-        if any(x in fields for x in fields_list):
-            for group_line in result:
-
-                # initialise fields to compute to 0 if they are requested
-                if 'practical_amount' in fields:
-                    group_line['practical_amount'] = 0
-                if 'theoritical_amount' in fields:
-                    group_line['theoritical_amount'] = 0
-                if 'percentage' in fields:
-                    group_line['percentage'] = 0
-                    group_line['practical_amount'] = 0
-                    group_line['theoritical_amount'] = 0
-
-                if group_line.get('__domain'):
-                    all_budget_lines_that_compose_group = self.search(group_line['__domain'])
-                else:
-                    all_budget_lines_that_compose_group = self.search([])
-                for budget_line_of_group in all_budget_lines_that_compose_group:
-                    if 'practical_amount' in fields or 'percentage' in fields:
-                        group_line['practical_amount'] += budget_line_of_group.practical_amount
-
-                    if 'theoritical_amount' in fields or 'percentage' in fields:
-                        group_line['theoritical_amount'] += budget_line_of_group.theoritical_amount
-
-                    if 'percentage' in fields:
-                        if group_line['theoritical_amount']:
-                            # use a weighted average
-                            group_line['percentage'] = float(
-                                (group_line['practical_amount'] or 0.0) / group_line['theoritical_amount']) * 100
+        if not any(x in fields for x in fields_list):
+            return super(CrossoveredBudgetLines, self).read_group(domain, fields, groupby, offset=offset, limit=limit,
+                                                                  orderby=orderby, lazy=lazy)
+
+        # the lines of each group are aggregated by the database, their
+        # amounts are then computed all at once
+        result = super(CrossoveredBudgetLines, self).read_group(
+            domain, list(fields - fields_list) + ['budget_line_ids:array_agg(id)'], groupby,
+            offset=offset, limit=limit, orderby=orderby, lazy=lazy)
+        all_lines = self.browse({line_id for group_line in result
+                                 for line_id in group_line['budget_line_ids'] or []})
+        practical_amounts = {}
+        theoritical_amounts = {}
+        if 'practical_amount' in fields or 'percentage' in fields:
+            practical_amounts = all_lines._get_practical_amounts()
+        if 'theoritical_amount' in fields or 'percentage' in fields:
+            theoritical_amounts = {line.id: line.theoritical_amount for line in all_lines}
+
+        for group_line in result:
+            line_ids = group_line.pop('budget_line_ids') or []
+
+            # initialise fields to compute to 0 if they are requested
+            if 'practical_amount' in fields:
+                group_line['practical_amount'] = 0
+            if 'theoritical_amount' in fields:
+                group_line['theoritical_amount'] = 0
+            if 'percentage' in fields:
+                group_line['percentage'] = 0
+                group_line['practical_amount'] = 0
+                group_line['theoritical_amount'] = 0
+
+            if 'practical_amount' in fields or 'percentage' in fields:
+                group_line['practical_amount'] = sum(practical_amounts.get(line_id, 0.0) for line_id in line_ids)
+
+            if 'theoritical_amount' in fields or 'percentage' in fields:
+                group_line['theoritical_amount'] = sum(theoritical_amounts[line_id] for line_id in line_ids)
+
+            if 'percentage' in fields:
+                if group_line['theoritical_amount']:
+                    # use a weighted average
+                    group_line['percentage'] = float(
+                        (group_line['practical_amount'] or 0.0) / group_line['theoritical_amount']) * 100
 
         return result
 
@@ -158,45 +181,220 @@ class CrossoveredBudgetLines(models.Model):
                 computed_name += ' - ' + line.analytic_account_id.name
             line.name = computed_name
 
+    @api.depends_context('budget_snapshot')
     def _compute_practical_amount(self):
+        amounts = self._get_practical_amounts()
+        for line in self:
+            line.practical_amount = amounts.get(line.id, 0.0)
+
+    def _get_practical_amounts(self, item_ids=None):
+        """ Practical amounts of the budget lines, as a dictionary
+            {line_id: amount}.
+
+            The lines are bucketed by (company, analytic account, budgetary
+            position, date range) and the amounts of all the buckets are
+            computed with one aggregate query on the analytic items and one
+            on the journal items, each joining the items on the periods of
+            the buckets. Only the items of the company of a line count, the
+            record rules don't apply when the snapshot is refreshed as
+            superuser.
+
+            With the context key 'budget_snapshot' {Boolean} the amounts of
+            the lines having a snapshot are read from it.
+
+            :param item_ids: optional dictionary {model_name: ids} restricting
+                the items of each model to the given ids
+        """
+        if self.env.context.get('budget_snapshot') and item_ids is None:
+            snapshot_lines = self.filtered('snapshot_date')
+            amounts = {line.id: line.snapshot_practical_amount for line in snapshot_lines}
+            if snapshot_lines != self:
+                amounts.update((self - snapshot_lines).with_context(
+                    budget_snapshot=False)._get_practical_amounts())
+            return amounts
+
+        analytic_buckets = defaultdict(list)
+        move_buckets = defaultdict(list)
         for line in self:
-            acc_ids = line.general_budget_id.account_ids.ids
-            date_to = line.date_to
-            date_from = line.date_from
+            # a budgetary position without accounts doesn't filter the
+            # analytic items
+            post_id = line.general_budget_id.account_ids and line.general_budget_id.id or 0
             if line.analytic_account_id.id:
-                analytic_line_obj = self.env['account.analytic.line']
-                domain = [('account_id', '=', line.analytic_account_id.id),
-                          ('date', '>=', date_from),
-                          ('date', '<=', date_to),
-                          ]
-                if acc_ids:
-                    domain += [('general_account_id', 'in', acc_ids)]
-
-                where_query = analytic_line_obj._where_calc(domain)
-                analytic_line_obj._apply_ir_rules(where_query, 'read')
-                from_string, from_params = where_query.from_clause
-                where_string, where_params = where_query.where_clause
-                from_clause, where_clause, where_clause_params = from_string, where_string, from_params + where_params
-
-                select = "SELECT SUM(amount) from " + from_clause + " where " + where_clause
-
+                analytic_buckets[(line.company_id.id, line.analytic_account_id.id, post_id,
+                                  line.date_from, line.date_to)].append(line.id)
             else:
-                aml_obj = self.env['account.move.line']
-                domain = [('account_id', 'in',
-                           line.general_budget_id.account_ids.ids),
-                          ('date', '>=', date_from),
-                          ('date', '<=', date_to)
-                          ]
-                where_query = aml_obj._where_calc(domain)
-                aml_obj._apply_ir_rules(where_query, 'read')
-                from_string, from_params = where_query.from_clause
-                where_string, where_params = where_query.where_clause
-                from_clause, where_clause, where_clause_params = from_string, where_string, from_params + where_params
-
-                select = "SELECT sum(credit)-sum(debit) from " + from_clause + " where " + where_clause
-
-            self.env.cr.execute(select, where_clause_params)
-            line.practical_amount = self.env.cr.fetchone()[0] or 0.0
+                move_buckets[(line.company_id.id, post_id,
+                              line.date_from, line.date_to)].append(line.id)
+
+        amounts = {}
+        if analytic_buckets:
+            keys = list(analytic_buckets)
+            analytic_line_obj = self.env['account.analytic.line']
+            where_query = analytic_line_obj._where_calc([])
+            analytic_line_obj._apply_ir_rules(where_query, 'read')
+            from_string, from_params = where_query.from_clause
+            where_string, where_params = where_query.where_clause
+            select = """
+                SELECT b.idx, SUM(account_analytic_line.amount)
+                FROM """ + from_string + """
+                JOIN unnest(%s::int[], %s::int[], %s::int[], %s::int[], %s::date[], %s::date[])
+                    AS b(idx, company_id, account_id, post_id, date_from, date_to)
+                    ON (account_analytic_line.account_id = b.account_id
+                        AND account_analytic_line.company_id = b.company_id
+                        AND account_analytic_line.date BETWEEN b.date_from AND b.date_to)
+                WHERE (b.post_id = 0 OR account_analytic_line.general_account_id IN (
+                        SELECT r.account_id FROM account_budget_rel r WHERE r.budget_id = b.post_id))
+                    AND """ + (where_string or 'TRUE') + """
+                    AND (%s::int[] IS NULL OR account_analytic_line.id = ANY(%s::int[]))
+                GROUP BY b.idx
+            """
+            ids = None if item_ids is None else item_ids.get('account.analytic.line', [])
+            params = list(from_params) + [
+                list(range(len(keys))),
+                [key[0] for key in keys],
+                [key[1] for key in keys],
+                [key[2] for key in keys],
+                [key[3] for key in keys],
+                [key[4] for key in keys],
+            ] + list(where_params) + [ids, ids]
+            self.env.cr.execute(select, params)
+            for idx, amount in self.env.cr.fetchall():
+                for line_id in analytic_buckets[keys[idx]]:
+                    amounts[line_id] = float(amount or 0.0)
+
+        if move_buckets:
+            keys = list(move_buckets)
+            aml_obj = self.env['account.move.line']
+            where_query = aml_obj._where_calc([])
+            aml_obj._apply_ir_rules(where_query, 'read')
+            from_string, from_params = where_query.from_clause
+            where_string, where_params = where_query.where_clause
+            select = """
+                SELECT b.idx, SUM(account_move_line.credit) - SUM(account_move_line.debit)
+                FROM """ + from_string + """
+                JOIN unnest(%s::int[], %s::int[], %s::int[], %s::date[], %s::date[])
+                    AS b(idx, company_id, post_id, date_from, date_to)
+                    ON (account_move_line.company_id = b.company_id
+                        AND account_move_line.date BETWEEN b.date_from AND b.date_to)
+                JOIN account_budget_rel r
+                    ON (r.budget_id = b.post_id AND r.account_id = account_move_line.account_id)
+                WHERE """ + (where_string or 'TRUE') + """
+                    AND (%s::int[] IS NULL OR account_move_line.id = ANY(%s::int[]))
+                GROUP BY b.idx
+            """
+            ids = None if item_ids is None else item_ids.get('account.move.line', [])
+            params = list(from_params) + [
+                list(range(len(keys))),
+                [key[0] for key in keys],
+                [key[1] for key in keys],
+                [key[2] for key in keys],
+                [key[3] for key in keys],
+            ] + list(where_params) + [ids, ids]
+            self.env.cr.execute(select, params)
+            for idx, amount in self.env.cr.fetchall():
+                for line_id in move_buckets[keys[idx]]:
+                    amounts[line_id] = float(amount or 0.0)
+        return amounts
+
+    def write(self, vals):
+        res = super(CrossoveredBudgetLines, self).write(vals)
+        if {'analytic_account_id', 'general_budget_id', 'date_from', 'date_to'} & set(vals):
+            self._reset_snapshot()
+        return res
+
+    def _reset_snapshot(self):
+        # the lines are recomputed from scratch by the next refresh
+        self.flush_recordset(['snapshot_date'])
+        if self.ids:
+            self.env.cr.execute(
+                "UPDATE crossovered_budget_lines SET snapshot_date = NULL WHERE id IN %s",
+                [tuple(self.ids)])
+            self.invalidate_recordset(['snapshot_date'])
+
+    def init(self):
+        # journal and analytic items created since the last refresh of the
+        # snapshot, queued by their transaction: items committed after a
+        # refresh are only seen by the next one, whatever their id
+        created = not tools.table_exists(self.env.cr, 'crossovered_budget_snapshot_queue')
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS crossovered_budget_snapshot_queue (
+                model varchar NOT NULL,
+                res_id integer NOT NULL
+            );
+
+            CREATE OR REPLACE FUNCTION crossovered_budget_snapshot_enqueue() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO crossovered_budget_snapshot_queue (model, res_id)
+                SELECT TG_ARGV[0], id FROM new_rows;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS crossovered_budget_snapshot_enqueue ON account_move_line;
+            CREATE TRIGGER crossovered_budget_snapshot_enqueue
+                AFTER INSERT ON account_move_line
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION crossovered_budget_snapshot_enqueue('account.move.line');
+            DROP TRIGGER IF EXISTS crossovered_budget_snapshot_enqueue ON account_analytic_line;
+            CREATE TRIGGER crossovered_budget_snapshot_enqueue
+                AFTER INSERT ON account_analytic_line
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION crossovered_budget_snapshot_enqueue('account.analytic.line');
+        """)
+        if created:
+            # the items created before the queue existed are not in it
+            self.env.cr.execute("UPDATE crossovered_budget_lines SET snapshot_date = NULL")
+
+    @api.model
+    def _refresh_snapshot(self, full=False):
+        """ Refresh the snapshot of the practical amounts of the budget lines.
+
+            The journal items and analytic items created since the last
+            refresh are taken from crossovered_budget_snapshot_queue, filled
+            by triggers: the lines already in the snapshot only add the
+            amounts of those items, the other lines (new ones, or whose
+            period or accounts changed) are computed from scratch. Items
+            modified or deleted after being processed are only taken into
+            account by a full refresh.
+
+            The lines of all the companies are refreshed as superuser, their
+            amounts only sum the items of their own company (see
+            :meth:`_get_practical_amounts`).
+        """
+        cr = self.env.cr
+        self.env['account.move.line'].flush_model()
+        self.env['account.analytic.line'].flush_model()
+        self.flush_model()
+        # only the queued items visible to this transaction are consumed,
+        # those of transactions still running stay for the next refresh
+        cr.execute("DELETE FROM crossovered_budget_snapshot_queue RETURNING model, res_id")
+        item_ids = defaultdict(list)
+        for model_name, res_id in cr.fetchall():
+            item_ids[model_name].append(res_id)
+
+        lines = self.sudo().with_context(budget_snapshot=False).search([])
+        stale_lines = lines if full else lines.filtered(lambda line: not line.snapshot_date)
+        snapshot_lines = lines - stale_lines
+        amounts = stale_lines._get_practical_amounts()
+        if snapshot_lines and item_ids:
+            deltas = snapshot_lines._get_practical_amounts(item_ids=dict(item_ids))
+        else:
+            deltas = {}
+        for line in snapshot_lines:
+            amounts[line.id] = line.snapshot_practical_amount + deltas.get(line.id, 0.0)
+
+        if lines:
+            cr.execute("""
+                UPDATE crossovered_budget_lines l
+                SET snapshot_practical_amount = v.amount, snapshot_date = %s
+                FROM unnest(%s::int[], %s::numeric[]) AS v(id, amount)
+                WHERE l.id = v.id
+            """, [fields.Datetime.now(), lines.ids, [amounts.get(line_id, 0.0) for line_id in lines.ids]])
+            lines.invalidate_recordset(['snapshot_practical_amount', 'snapshot_date'])
+
+    def action_refresh_snapshot(self):
+        self._refresh_snapshot()
+        return True
 
     def _compute_theoritical_amount(self):
         # beware: 'today' variable is mocked in the python tests and thus, its implementation matter
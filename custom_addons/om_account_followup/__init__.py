@@ -1,3 +1,18 @@
 from . import wizard
 from . import models
 from . import report
+
+
+def uninstall_hook(env):
+    # the statistics triggers would otherwise outlive their tables and break
+    # every write on the journal items
+    env.cr.execute("""
+        DROP TRIGGER IF EXISTS followup_stat_by_partner_insert ON account_move_line;
+        DROP TRIGGER IF EXISTS followup_stat_by_partner_update ON account_move_line;
+        DROP TRIGGER IF EXISTS followup_stat_by_partner_delete ON account_move_line;
+        DROP TRIGGER IF EXISTS followup_stat_by_partner_account ON account_account;
+        DROP FUNCTION IF EXISTS followup_stat_by_partner_refresh();
+        DROP FUNCTION IF EXISTS followup_stat_by_partner_refresh_account();
+        DROP FUNCTION IF EXISTS followup_stat_by_partner_refresh_keys(integer[], integer[]);
+        DROP TABLE IF EXISTS followup_stat_by_due_date;
+    """)
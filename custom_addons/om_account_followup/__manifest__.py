@@ -12,6 +12,7 @@
         'security/security.xml',
         'security/ir.model.access.csv',
         'data/mail_template_data.xml',
+        'data/followup_mailing_data.xml',
         'wizard/followup_print_view.xml',
         'wizard/followup_results_view.xml',
         'views/followup_view.xml',
@@ -20,8 +21,10 @@
         'views/report_followup.xml',
         'views/reports.xml',
         'views/followup_partner_view.xml',
+        'views/followup_mailing_view.xml',
         'report/followup_report.xml',
     ],
     'demo': ['demo/demo.xml'],
     'images': ['static/description/banner.png'],
+    'uninstall_hook': 'uninstall_hook',
 }
@@ -3,5 +3,6 @@
 from . import account_move
 from . import followup
 from . import followup_partner
+from . import followup_mailing
 from . import partner
 from . import settings
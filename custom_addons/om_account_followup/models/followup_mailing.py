@@ -0,0 +1,103 @@
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class FollowupMailing(models.Model):
+    """ Follow-up emails queued by the follow-up wizard.
+
+        The wizard only records the partners to remind; their emails are
+        rendered by a cron job, ``_mailing_chunk_size`` partners at a time,
+        and handed over to the mail queue. The record keeps track of the
+        progress.
+    """
+    _name = 'followup.mailing'
+    _description = 'Follow-up Mailing'
+    _order = 'id desc'
+
+    name = fields.Char('Name', required=True, readonly=True)
+    followup_id = fields.Many2one('followup.followup', 'Follow-Up', readonly=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', 'Company', required=True, readonly=True,
+                                 default=lambda self: self.env.company)
+    user_id = fields.Many2one('res.users', 'Sent By', required=True, readonly=True,
+                              default=lambda self: self.env.user)
+    date = fields.Date('Follow-up Sending Date', readonly=True)
+    state = fields.Selection([('queued', 'Queued'),
+                              ('in_progress', 'In Progress'),
+                              ('done', 'Done'),
+                              ('failed', 'Failed')], string='Status',
+                             required=True, readonly=True, default='queued')
+    partner_ids = fields.Many2many('res.partner', 'followup_mailing_partner_rel',
+                                   'mailing_id', 'partner_id', 'Partners to Remind',
+                                   readonly=True)
+    partner_count = fields.Integer('Partners', readonly=True)
+    processed_count = fields.Integer('Processed Partners', readonly=True)
+    unknown_mail_count = fields.Integer('Unknown Email Addresses', readonly=True)
+    progress = fields.Float('Progress', compute='_compute_progress')
+    error_message = fields.Text('Error', readonly=True)
+
+    # number of partners whose emails are rendered at once
+    _mailing_chunk_size = 200
+
+    @api.depends('partner_count', 'processed_count')
+    def _compute_progress(self):
+        for mailing in self:
+            mailing.progress = mailing.partner_count and \
+                100.0 * mailing.processed_count / mailing.partner_count
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        mailings = super().create(vals_list)
+        self.env.ref('om_account_followup.ir_cron_followup_mailing')._trigger()
+        return mailings
+
+    def _process_chunk(self):
+        """ Render and queue the emails of the next chunk of partners, as
+            the user who ran the follow-ups.
+        """
+        self.ensure_one()
+        partners = self.partner_ids[:self._mailing_chunk_size]
+        unknown_mails = partners.with_user(self.user_id).with_company(
+            self.company_id).do_partner_mail()
+        self.write({
+            'partner_ids': [(3, partner.id) for partner in partners],
+            'processed_count': self.processed_count + len(partners),
+            'unknown_mail_count': self.unknown_mail_count + unknown_mails,
+            'state': 'in_progress' if len(partners) < len(self.partner_ids) else 'done',
+        })
+
+    def _process(self):
+        """ Process the remaining partners of the mailings. With the context
+            key 'followup_mailing_commit' {Boolean} every chunk is committed,
+            so that an interrupted run resumes with the partners not yet
+            reminded, and a mailing whose chunk fails is marked as failed
+            instead of blocking the next ones.
+        """
+        commit = self.env.context.get('followup_mailing_commit')
+        for mailing in self:
+            while mailing.state in ('queued', 'in_progress'):
+                if not commit:
+                    mailing._process_chunk()
+                    continue
+                try:
+                    with self.env.cr.savepoint():
+                        mailing._process_chunk()
+                except Exception as e:
+                    _logger.exception("Follow-up mailing %s failed", mailing.name)
+                    mailing.write({'state': 'failed', 'error_message': str(e)})
+                self.env.cr.commit()
+
+    @api.model
+    def _cron_process_mailings(self):
+        self.search([('state', 'in', ('queued', 'in_progress'))], order='id').with_context(
+            followup_mailing_commit=True)._process()
+
+    def action_process(self):
+        """ Queue the failed mailings again, resuming with the partners not yet reminded,
+            and wake up the cron job processing them.
+        """
+        self.filtered(lambda mailing: mailing.state == 'failed').write({'state': 'queued', 'error_message': False})
+        self.env.ref('om_account_followup.ir_cron_followup_mailing')._trigger()
+        return True
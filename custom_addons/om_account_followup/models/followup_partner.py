@@ -3,10 +3,27 @@ from odoo import tools
 
 
 class FollowupStatByPartner(models.Model):
+    """ Unreconciled receivable balance of each partner and company.
+
+        Unlike a regular view the rows are stored in a table, kept up to date
+        by PostgreSQL triggers on account_move_line: each statement touching
+        journal items recomputes the (partner, company) keys it changed.
+        The same triggers maintain followup_stat_by_due_date, the balances of
+        the partners by due date, used to search the partners on their due
+        and overdue amounts.
+    """
     _name = "followup.stat.by.partner"
     _description = "Follow-up Statistics by Partner"
     _rec_name = 'partner_id'
     _auto = False
+    _depends = {
+        'account.move.line': [
+            'partner_id', 'company_id', 'account_id', 'full_reconcile_id',
+            'date', 'date_maturity', 'followup_date', 'followup_line_id',
+            'debit', 'credit',
+        ],
+        'account.account': ['account_type'],
+    }
 
     def _get_invoice_partner_id(self):
         for rec in self:
@@ -24,27 +41,292 @@ class FollowupStatByPartner(models.Model):
 
     @api.model
     def init(self):
-        tools.drop_view_if_exists(self.env.cr, 'followup_stat_by_partner')
-        self.env.cr.execute("""
-            create view followup_stat_by_partner as (
+        cr = self.env.cr
+        tools.drop_view_if_exists(cr, 'followup_stat_by_partner')
+        if tools.table_exists(cr, 'followup_stat_by_partner') and not tools.index_exists(
+                cr, 'followup_stat_by_partner_partner_company_uniq'):
+            # rows of a previous version, keyed on partner and company ids
+            cr.execute("DROP TABLE followup_stat_by_partner")
+        created = not tools.table_exists(cr, 'followup_stat_by_partner')
+        cr.execute("""
+            CREATE TABLE IF NOT EXISTS followup_stat_by_partner (
+                id bigserial PRIMARY KEY,
+                partner_id integer NOT NULL,
+                date_move date,
+                date_move_last date,
+                date_followup date,
+                max_followup_id integer,
+                balance numeric,
+                company_id integer NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS followup_stat_by_partner_partner_company_uniq
+                ON followup_stat_by_partner (partner_id, company_id);
+            CREATE TABLE IF NOT EXISTS followup_stat_by_due_date (
+                partner_id integer NOT NULL,
+                company_id integer NOT NULL,
+                date_due date NOT NULL,
+                balance numeric,
+                PRIMARY KEY (partner_id, company_id, date_due)
+            );
+            CREATE INDEX IF NOT EXISTS followup_stat_by_due_date_company_idx
+                ON followup_stat_by_due_date (company_id, date_due);
+
+            -- recompute the statistics of the given (partner, company) keys
+            CREATE OR REPLACE FUNCTION followup_stat_by_partner_refresh_keys(
+                partner_ids integer[], company_ids integer[]) RETURNS void AS $$
+            BEGIN
+                -- the rows are upserted below, only those left without
+                -- unreconciled receivable items are deleted
+                DELETE FROM followup_stat_by_partner s
+                USING unnest(partner_ids, company_ids) AS k(partner_id, company_id)
+                WHERE s.partner_id = k.partner_id AND s.company_id = k.company_id
+                    AND NOT EXISTS (
+                        SELECT 1 FROM account_move_line l
+                        JOIN account_account a ON (l.account_id = a.id)
+                        WHERE l.partner_id = s.partner_id AND l.company_id = s.company_id
+                            AND a.account_type = 'asset_receivable'
+                            AND l.full_reconcile_id IS NULL);
+                DELETE FROM followup_stat_by_due_date s
+                USING unnest(partner_ids, company_ids) AS k(partner_id, company_id)
+                WHERE s.partner_id = k.partner_id AND s.company_id = k.company_id
+                    AND NOT EXISTS (
+                        SELECT 1 FROM account_move_line l
+                        JOIN account_account a ON (l.account_id = a.id)
+                        WHERE l.partner_id = s.partner_id AND l.company_id = s.company_id
+                            AND COALESCE(l.date_maturity, l.date) = s.date_due
+                            AND a.account_type = 'asset_receivable'
+                            AND l.full_reconcile_id IS NULL);
+
+                INSERT INTO followup_stat_by_partner (partner_id, date_move, date_move_last,
+                    date_followup, max_followup_id, balance, company_id)
                 SELECT
-                    l.partner_id * 10000::bigint + l.company_id as id,
-                    l.partner_id AS partner_id,
-                    min(l.date) AS date_move,
-                    max(l.date) AS date_move_last,
-                    max(l.followup_date) AS date_followup,
-                    max(l.followup_line_id) AS max_followup_id,
-                    sum(l.debit - l.credit) AS balance,
-                    l.company_id as company_id
-                FROM
-                    account_move_line l
-                    LEFT JOIN account_account a ON (l.account_id = a.id)
-                WHERE
-                    a.account_type = 'asset_receivable' AND
-                    l.full_reconcile_id is NULL AND
-                    l.partner_id IS NOT NULL
-                    GROUP BY
-                    l.partner_id, l.company_id
-            )""")
+                    l.partner_id,
+                    min(l.date),
+                    max(l.date),
+                    max(l.followup_date),
+                    max(l.followup_line_id),
+                    sum(l.debit - l.credit),
+                    l.company_id
+                FROM account_move_line l
+                JOIN account_account a ON (l.account_id = a.id)
+                WHERE a.account_type = 'asset_receivable'
+                    AND l.full_reconcile_id IS NULL
+                    AND (l.partner_id, l.company_id) IN (
+                        SELECT * FROM unnest(partner_ids, company_ids))
+                GROUP BY l.partner_id, l.company_id
+                ON CONFLICT (partner_id, company_id) DO UPDATE SET
+                    date_move = EXCLUDED.date_move,
+                    date_move_last = EXCLUDED.date_move_last,
+                    date_followup = EXCLUDED.date_followup,
+                    max_followup_id = EXCLUDED.max_followup_id,
+                    balance = EXCLUDED.balance;
+
+                INSERT INTO followup_stat_by_due_date (partner_id, company_id, date_due, balance)
+                SELECT l.partner_id, l.company_id, COALESCE(l.date_maturity, l.date),
+                    sum(l.debit - l.credit)
+                FROM account_move_line l
+                JOIN account_account a ON (l.account_id = a.id)
+                WHERE a.account_type = 'asset_receivable'
+                    AND l.full_reconcile_id IS NULL
+                    AND (l.partner_id, l.company_id) IN (
+                        SELECT * FROM unnest(partner_ids, company_ids))
+                GROUP BY l.partner_id, l.company_id, COALESCE(l.date_maturity, l.date)
+                ON CONFLICT (partner_id, company_id, date_due) DO UPDATE SET
+                    balance = EXCLUDED.balance;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            -- statement level trigger on account_move_line, the keys are
+            -- read from the transition tables of the statement
+            CREATE OR REPLACE FUNCTION followup_stat_by_partner_refresh() RETURNS trigger AS $$
+            DECLARE
+                partner_ids integer[];
+                company_ids integer[];
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    SELECT array_agg(partner_id), array_agg(company_id)
+                    INTO partner_ids, company_ids
+                    FROM (SELECT DISTINCT partner_id, company_id FROM new_rows
+                          WHERE partner_id IS NOT NULL) k;
+                ELSIF TG_OP = 'DELETE' THEN
+                    SELECT array_agg(partner_id), array_agg(company_id)
+                    INTO partner_ids, company_ids
+                    FROM (SELECT DISTINCT partner_id, company_id FROM old_rows
+                          WHERE partner_id IS NOT NULL) k;
+                ELSE
+                    SELECT array_agg(partner_id), array_agg(company_id)
+                    INTO partner_ids, company_ids
+                    FROM (
+                        SELECT o.partner_id, o.company_id
+                        FROM old_rows o JOIN new_rows n ON (n.id = o.id)
+                        WHERE (o.partner_id, o.company_id, o.account_id, o.full_reconcile_id,
+                               o.date, o.date_maturity, o.followup_date, o.followup_line_id,
+                               o.debit, o.credit)
+                            IS DISTINCT FROM
+                              (n.partner_id, n.company_id, n.account_id, n.full_reconcile_id,
+                               n.date, n.date_maturity, n.followup_date, n.followup_line_id,
+                               n.debit, n.credit)
+                        UNION
+                        SELECT n.partner_id, n.company_id
+                        FROM old_rows o JOIN new_rows n ON (n.id = o.id)
+                        WHERE (o.partner_id, o.company_id, o.account_id, o.full_reconcile_id,
+                               o.date, o.date_maturity, o.followup_date, o.followup_line_id,
+                               o.debit, o.credit)
+                            IS DISTINCT FROM
+                              (n.partner_id, n.company_id, n.account_id, n.full_reconcile_id,
+                               n.date, n.date_maturity, n.followup_date, n.followup_line_id,
+                               n.debit, n.credit)
+                    ) k
+                    WHERE partner_id IS NOT NULL;
+                END IF;
+                IF partner_ids IS NOT NULL THEN
+                    PERFORM followup_stat_by_partner_refresh_keys(partner_ids, company_ids);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            -- changing the type of an account moves all its items in or out
+            CREATE OR REPLACE FUNCTION followup_stat_by_partner_refresh_account() RETURNS trigger AS $$
+            DECLARE
+                partner_ids integer[];
+                company_ids integer[];
+            BEGIN
+                SELECT array_agg(partner_id), array_agg(company_id)
+                INTO partner_ids, company_ids
+                FROM (
+                    SELECT DISTINCT l.partner_id, l.company_id
+                    FROM account_move_line l
+                    JOIN old_rows o ON (o.id = l.account_id)
+                    JOIN new_rows n ON (n.id = o.id)
+                    WHERE o.account_type IS DISTINCT FROM n.account_type
+                        AND l.partner_id IS NOT NULL
+                ) k;
+                IF partner_ids IS NOT NULL THEN
+                    PERFORM followup_stat_by_partner_refresh_keys(partner_ids, company_ids);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
 
+            DROP TRIGGER IF EXISTS followup_stat_by_partner_insert ON account_move_line;
+            CREATE TRIGGER followup_stat_by_partner_insert
+                AFTER INSERT ON account_move_line
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION followup_stat_by_partner_refresh();
+            DROP TRIGGER IF EXISTS followup_stat_by_partner_update ON account_move_line;
+            CREATE TRIGGER followup_stat_by_partner_update
+                AFTER UPDATE ON account_move_line
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION followup_stat_by_partner_refresh();
+            DROP TRIGGER IF EXISTS followup_stat_by_partner_delete ON account_move_line;
+            CREATE TRIGGER followup_stat_by_partner_delete
+                AFTER DELETE ON account_move_line
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION followup_stat_by_partner_refresh();
+            DROP TRIGGER IF EXISTS followup_stat_by_partner_account ON account_account;
+            CREATE TRIGGER followup_stat_by_partner_account
+                AFTER UPDATE ON account_account
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION followup_stat_by_partner_refresh_account();
+        """)
+        if created:
+            self._rebuild()
 
+    @api.model
+    def _rebuild(self):
+        """ Recompute the statistics of all the partners. """
+        self.env['account.move.line'].flush_model()
+        self.env.cr.execute("""
+            SELECT array_agg(partner_id), array_agg(company_id)
+            FROM (SELECT DISTINCT partner_id, company_id FROM account_move_line
+                  WHERE partner_id IS NOT NULL) k
+        """)
+        partner_ids, company_ids = self.env.cr.fetchone()
+        self.env.cr.execute("DELETE FROM followup_stat_by_partner")
+        self.env.cr.execute("DELETE FROM followup_stat_by_due_date")
+        if partner_ids:
+            self.env.cr.execute("SELECT followup_stat_by_partner_refresh_keys(%s, %s)",
+                                (partner_ids, company_ids))
+        self.invalidate_model()
+
+    @api.model
+    def _flush_depends(self):
+        # the triggers only see what has been written to the database
+        for model_name, field_names in self._depends.items():
+            self.env[model_name].flush_model(field_names)
+
+    @api.model
+    def _get_stat_ids(self, keys):
+        """ Ids of the statistics of the given (partner_id, company_id) keys,
+            read with one query.
+
+            :returns: a dictionary {(partner_id, company_id): id} of the keys
+                having unreconciled receivable items
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        self._flush_depends()
+        self.env.cr.execute("""
+            SELECT s.partner_id, s.company_id, s.id
+            FROM followup_stat_by_partner s
+            JOIN unnest(%s::int[], %s::int[]) AS k(partner_id, company_id)
+                ON (s.partner_id = k.partner_id AND s.company_id = k.company_id)
+        """, ([key[0] for key in keys], [key[1] for key in keys]))
+        return {(partner_id, company_id): stat_id
+                for partner_id, company_id, stat_id in self.env.cr.fetchall()}
+
+    @api.model
+    def _get_partner_balances(self, company_id, date_due=None):
+        """ Unreconciled receivable balance of the partners of the company,
+            limited to the amounts due on or before ``date_due`` if given.
+
+            :returns: a dictionary {partner_id: balance} of the partners
+                having unreconciled receivable items
+        """
+        self._flush_depends()
+        query = """
+            SELECT partner_id, SUM(balance) FROM followup_stat_by_due_date
+            WHERE company_id = %s
+        """
+        params = [company_id]
+        if date_due:
+            query += " AND date_due <= %s"
+            params.append(date_due)
+        self.env.cr.execute(query + " GROUP BY partner_id", params)
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _get_partner_due_dates(self, company_id):
+        """ Earliest due date of the unreconciled receivable items of the
+            partners of the company, as a dictionary {partner_id: date}.
+        """
+        self._flush_depends()
+        self.env.cr.execute("""
+            SELECT partner_id, MIN(date_due) FROM followup_stat_by_due_date
+            WHERE company_id = %s GROUP BY partner_id
+        """, [company_id])
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _get_partner_amounts(self, company_id, partner_ids, date_due):
+        """ Amount due, amount overdue at ``date_due`` and earliest due date
+            of the unreconciled receivable items of the given partners in the
+            company.
+
+            :returns: a dictionary {partner_id: (due, overdue, earliest date)}
+                of the partners having unreconciled receivable items
+        """
+        if not partner_ids:
+            return {}
+        self._flush_depends()
+        self.env.cr.execute("""
+            SELECT partner_id, SUM(balance),
+                COALESCE(SUM(balance) FILTER (WHERE date_due <= %s), 0.0),
+                MIN(date_due)
+            FROM followup_stat_by_due_date
+            WHERE company_id = %s AND partner_id IN %s
+            GROUP BY partner_id
+        """, [date_due, company_id, tuple(partner_ids)])
+        return {row[0]: row[1:] for row in self.env.cr.fetchall()}
@@ -1,3 +1,5 @@
+import operator
+from collections import defaultdict
 from functools import reduce
 from lxml import etree
 from odoo import api, fields, models, _
@@ -5,6 +7,15 @@ from datetime import datetime
 from odoo.exceptions import ValidationError
 from odoo.tools.misc import formatLang
 
+FOLLOWUP_OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
 
 class ResPartner(models.Model):
     _inherit = "res.partner"
@@ -23,31 +34,34 @@ class ResPartner(models.Model):
         return res
 
     def _get_latest(self):
+        # one query for all the partners, the values are then kept in the
+        # cache for the rest of the request
         company = self.env.user.company_id
+        latest = {}
+        partner_ids = [partner_id for partner_id in self.ids if partner_id]
+        if partner_ids:
+            self.env['account.move.line'].flush_model([
+                'partner_id', 'company_id', 'account_id', 'full_reconcile_id',
+                'followup_line_id', 'followup_date'])
+            self.env.cr.execute("""
+                SELECT l.partner_id, MAX(l.followup_date),
+                    (ARRAY_AGG(fl.id ORDER BY fl.delay DESC, l.id)
+                        FILTER (WHERE fl.id IS NOT NULL))[1]
+                FROM account_move_line l
+                JOIN account_account a ON (a.id = l.account_id)
+                LEFT JOIN followup_line fl ON (fl.id = l.followup_line_id)
+                WHERE l.partner_id IN %s
+                    AND l.company_id = %s
+                    AND l.full_reconcile_id IS NULL
+                    AND a.account_type = 'asset_receivable'
+                GROUP BY l.partner_id
+            """, (tuple(partner_ids), company.id))
+            latest = {row[0]: row[1:] for row in self.env.cr.fetchall()}
         for partner in self:
-            amls = partner.unreconciled_aml_ids
-            latest_date = False
-            latest_level = False
-            latest_days = False
-            latest_level_without_lit = False
-            latest_days_without_lit = False
-            for aml in amls:
-                aml_followup = aml.followup_line_id
-                if (aml.company_id == company) and aml_followup and \
-                        (not latest_days or latest_days < aml_followup.delay):
-                    latest_days = aml_followup.delay
-                    latest_level = aml_followup.id
-                if (aml.company_id == company) and aml.followup_date and (
-                        not latest_date or latest_date < aml.followup_date):
-                    latest_date = aml.followup_date
-                if (aml.company_id == company) and \
-                        (aml_followup and (not latest_days_without_lit or
-                         latest_days_without_lit < aml_followup.delay)):
-                    latest_days_without_lit = aml_followup.delay
-                    latest_level_without_lit = aml_followup.id
+            latest_date, latest_level = latest.get(partner.id, (False, False))
             partner.latest_followup_date = latest_date
             partner.latest_followup_level_id = latest_level
-            partner.latest_followup_level_id_without_lit = latest_level_without_lit
+            partner.latest_followup_level_id_without_lit = latest_level
 
     def do_partner_manual_action_dermanord(self, followup_line):
         action_text = followup_line.manual_action_note or ''
@@ -99,10 +113,17 @@ class ResPartner(models.Model):
             self, data=datas)
 
     def do_partner_mail(self):
+        """ Queue the follow-up emails of the partners, rendered with one
+            batch per email template.
+
+            :returns: the number of partners without email address
+        """
         ctx = self.env.context.copy()
         ctx['followup'] = True
         template = 'om_account_followup.email_template_om_account_followup_default'
         unknown_mails = 0
+        res_ids_per_template = defaultdict(list)
+        log_bodies = {}
         for partner in self:
             partners_to_email = [child for child in partner.child_ids if
                                  child.type == 'invoice' and child.email]
@@ -110,21 +131,19 @@ class ResPartner(models.Model):
                 partners_to_email = [partner]
             if partners_to_email:
                 level = partner.latest_followup_level_id_without_lit
-                for partner_to_email in partners_to_email:
-                    if level and level.send_email and \
-                            level.email_template_id and \
-                            level.email_template_id.id:
-                        level.email_template_id.with_context(ctx).send_mail(
-                            partner_to_email.id)
-                    else:
-                        mail_template_id = self.env.ref(template)
-                        mail_template_id.with_context(ctx).send_mail(
-                            partner_to_email.id)
+                if level and level.send_email and \
+                        level.email_template_id and \
+                        level.email_template_id.id:
+                    mail_template_id = level.email_template_id
+                else:
+                    mail_template_id = self.env.ref(template)
+                res_ids_per_template[mail_template_id].extend(
+                    partner_to_email.id for partner_to_email in partners_to_email)
                 if partner not in partners_to_email:
-                    partner.message_post(body=_(
+                    log_bodies[partner.id] = _(
                         'Overdue email sent to %s' % ', '.join(
                             ['%s <%s>' % (partner.name, partner.email) for
-                             partner in partners_to_email])))
+                             partner in partners_to_email]))
             else:
                 unknown_mails = unknown_mails + 1
                 action_text = _("Email not sent because of email address "
@@ -143,6 +162,10 @@ class ResPartner(models.Model):
                 partner.with_context(ctx).write(
                     {'payment_next_action_date': payment_action_date,
                      'payment_next_action': payment_next_action})
+        for mail_template_id, res_ids in res_ids_per_template.items():
+            mail_template_id.with_context(ctx).send_mail_batch(res_ids)
+        if log_bodies:
+            self.browse(list(log_bodies))._message_log_batch(bodies=log_bodies)
         return unknown_mails
 
     def get_followup_table_html(self):
@@ -237,7 +260,8 @@ class ResPartner(models.Model):
         self.message_post(body=_('Printed overdue payments report'))
         self.message_post(body=_('Printed overdue payments report'))
 
-        wizard_partner_ids = [self.id * 10000 + company_id]
+        wizard_partner_ids = list(self.env['followup.stat.by.partner']._get_stat_ids(
+            [(self.id, company_id)]).values())
         followup_ids = self.env['followup.followup'].search(
             [('company_id', '=', company_id)])
         if not followup_ids:
@@ -250,100 +274,52 @@ class ResPartner(models.Model):
         return self.do_partner_print(wizard_partner_ids, data)
 
     def _get_amounts_and_date(self):
+        # read from the follow-up statistics by due date, in one query for
+        # all the partners
         company = self.env.user.company_id
-        current_date = fields.Date.today()
+        amounts = self.env['followup.stat.by.partner']._get_partner_amounts(
+            company.id, [partner_id for partner_id in self.ids if partner_id],
+            fields.Date.today())
         for partner in self:
-            worst_due_date = False
-            amount_due = amount_overdue = 0.0
-            for aml in partner.unreconciled_aml_ids:
-                if (aml.company_id == company):
-                    date_maturity = aml.date_maturity or aml.date
-                    if not worst_due_date or date_maturity < worst_due_date:
-                        worst_due_date = date_maturity
-                    amount_due += aml.result
-                    if (date_maturity <= current_date):
-                        amount_overdue += aml.result
+            amount_due, amount_overdue, worst_due_date = amounts.get(
+                partner.id, (0.0, 0.0, False))
             partner.payment_amount_due = amount_due
             partner.payment_amount_overdue = amount_overdue
             partner.payment_earliest_due_date = worst_due_date
 
-    def _get_followup_overdue_query(self, args, overdue_only=False):
-        company_id = self.env.user.company_id.id
-        having_clauses = []
-        having_values = []
-
-        for field, operator, value in args:
-            if operator in ['=', '!=', '>', '>=', '<', '<=']:
-                having_clauses.append(f'SUM(bal2) {operator} %s')
-                having_values.append(value)
-            else:
-                raise ValueError(f"Unsupported operator: {operator}")
-
-        having_where_clause = ' AND '.join(having_clauses)
-        overdue_only_str = 'AND date_maturity <= NOW()' if overdue_only else ''
-
-        query = ('''
-            SELECT pid AS partner_id, SUM(bal2) FROM (
-                SELECT 
-                    CASE WHEN bal IS NOT NULL THEN bal ELSE 0.0 END AS bal2, 
-                    p.id as pid 
-                FROM (
-                    SELECT 
-                        (debit - credit) AS bal, 
-                        partner_id 
-                    FROM account_move_line l
-                    LEFT JOIN account_account a ON a.id = l.account_id
-                    WHERE a.account_type = 'asset_receivable'
-                    %s AND full_reconcile_id IS NULL
-                    AND l.company_id = %%s
-                ) AS l
-                RIGHT JOIN res_partner p ON p.id = partner_id 
-            ) AS pl
-            GROUP BY pid HAVING %s
-        ''') % (overdue_only_str, having_where_clause)
-
-        params = [company_id] + having_values
-        return query, params
+    def _search_followup_balance(self, operator, operand, overdue_only=False):
+        """ Domain on the partners whose unreconciled receivable balance in
+            the current company, read from the follow-up statistics, matches
+            ``operator`` and ``operand``. Partners without unreconciled items
+            have a balance of zero.
+        """
+        if operator not in FOLLOWUP_OPERATORS:
+            raise ValueError(f"Unsupported operator: {operator}")
+        compare = FOLLOWUP_OPERATORS[operator]
+        balances = self.env['followup.stat.by.partner']._get_partner_balances(
+            self.env.user.company_id.id,
+            date_due=overdue_only and fields.Date.context_today(self))
+        if compare(0.0, operand):
+            return [('id', 'not in', [partner_id for partner_id, balance in balances.items()
+                                      if not compare(balance, operand)])]
+        return [('id', 'in', [partner_id for partner_id, balance in balances.items()
+                              if compare(balance, operand)])]
 
     def _payment_overdue_search(self, operator, operand):
-        args = [('payment_amount_overdue', operator, operand)]
-        query, params = self._get_followup_overdue_query(args, overdue_only=True)
-        self.env.cr.execute(query, params)
-        res = self.env.cr.fetchall()
-        if not res:
-            return [('id', '=', '0')]
-        return [('id', 'in', [x[0] for x in res])]
+        return self._search_followup_balance(operator, operand, overdue_only=True)
 
     def _payment_earliest_date_search(self, operator, operand):
-        args = [('payment_earliest_due_date', operator, operand)]
-        company_id = self.env.user.company_id.id
-        having_where_clause = ' AND '.join(
-            map(lambda x: "(MIN(l.date_maturity) %s '%%s')" % (x[1]), args))
-        having_values = [x[2] for x in args]
-        having_where_clause = having_where_clause % (having_values[0])
-        query = """SELECT partner_id FROM account_move_line l
-                LEFT JOIN account_account a ON a.id = l.account_id
-                WHERE a.account_type = 'asset_receivable' 
-                AND l.company_id = %s 
-                AND l.full_reconcile_id IS NULL 
-                AND partner_id IS NOT NULL GROUP BY partner_id"""
-        query = query % company_id
-        if having_where_clause:
-            query += ' HAVING %s ' % (having_where_clause)
-        self.env.cr.execute(query)
-        res = self.env.cr.fetchall()
-        if not res:
-            return [('id', '=', '0')]
-        return [('id', 'in', [x[0] for x in res])]
+        if operator not in FOLLOWUP_OPERATORS:
+            raise ValueError(f"Unsupported operator: {operator}")
+        compare = FOLLOWUP_OPERATORS[operator]
+        operand = fields.Date.to_date(operand)
+        due_dates = self.env['followup.stat.by.partner']._get_partner_due_dates(
+            self.env.user.company_id.id)
+        return [('id', 'in', [partner_id for partner_id, date_due in due_dates.items()
+                              if compare(date_due, operand)])]
 
     def _payment_due_search(self, operator, operand):
-        args = [('payment_amount_due', operator, operand)]
-        query, params = self._get_followup_overdue_query(args, overdue_only=False)
-        self.env.cr.execute(query, params)
-        res = self.env.cr.fetchall()
-        if not res:
-            return [('id', '=', '0')]
-        return [('id', 'in', [x[0] for x in res])]
+        return self._search_followup_balance(operator, operand)
 
     def _get_partners(self):
         partners = set()
@@ -1,5 +1,6 @@
 import datetime
 import time
+from collections import defaultdict
 from odoo import api, fields, models, _
 from markupsafe import Markup
 
@@ -45,16 +46,18 @@ class FollowupPrint(models.TransientModel):
     def process_partners(self, partner_ids, data):
         partner_obj = self.env['res.partner']
         partner_ids_to_print = []
+        partners_to_mail = partner_obj
+        manual_partner_ids = []
         nbmanuals = 0
         manuals = {}
         nbmails = 0
-        nbunknownmails = 0
         nbprints = 0
+        letter_bodies = {}
         resulttext = " "
         for partner in self.env['followup.stat.by.partner'].browse(
                 partner_ids):
             if partner.max_followup_id.manual_action:
-                partner_obj.do_partner_manual_action([partner.partner_id.id])
+                manual_partner_ids.append(partner.partner_id.id)
                 nbmanuals = nbmanuals + 1
                 key = partner.partner_id.payment_responsible_id.name or _(
                     "Anybody")
@@ -63,24 +66,37 @@ class FollowupPrint(models.TransientModel):
                 else:
                     manuals[key] = manuals[key] + 1
             if partner.max_followup_id.send_email:
-                nbunknownmails += partner.partner_id.do_partner_mail()
+                partners_to_mail |= partner.partner_id
                 nbmails += 1
             if partner.max_followup_id.send_letter:
                 partner_ids_to_print.append(partner.id)
                 nbprints += 1
                 followup_without_lit = \
                     partner.partner_id.latest_followup_level_id_without_lit
-                message = "%s<I> %s </I>%s" % (_("Follow-up letter of "),
-                                               followup_without_lit.name,
-                                               _(" will be sent"))
-                partner.partner_id.message_post(body=message)
-        if nbunknownmails == 0:
-            resulttext += str(nbmails) + _(" email(s) sent")
-        else:
-            resulttext += str(nbmails) + _(
-                " email(s) should have been sent, but ") + str(
-                nbunknownmails) + _(
-                " had unknown email address(es)") + "\n <BR/> "
+                message = Markup("%s<I> %s </I>%s") % (
+                    _("Follow-up letter of "), followup_without_lit.name,
+                    _(" will be sent"))
+                letter_bodies[partner.partner_id.id] = message
+        if manual_partner_ids:
+            partner_obj.do_partner_manual_action(manual_partner_ids)
+        if letter_bodies:
+            partner_obj.browse(list(letter_bodies))._message_log_batch(
+                bodies=letter_bodies)
+        # the emails are rendered and sent in the background
+        mailing = self.env['followup.mailing']
+        if partners_to_mail:
+            mailing = mailing.create({
+                'name': _("Follow-ups of %s") % fields.Date.to_string(self.date),
+                'followup_id': self.followup_id.id,
+                'company_id': self.company_id.id or self.env.company.id,
+                'date': self.date,
+                'partner_ids': [(6, 0, partners_to_mail.ids)],
+                'partner_count': len(partners_to_mail),
+            })
+        resulttext += str(nbmails) + _(" email(s) queued")
+        if mailing:
+            resulttext += _(", see the progress in ") + mailing.name
+        resulttext += " \n <BR/> "
         resulttext += "<BR/>" + str(nbprints) + _(
             " letter(s) in report") + " \n <BR/>" + str(nbmanuals) + _(
             " manual action(s) assigned:")
@@ -97,14 +113,24 @@ class FollowupPrint(models.TransientModel):
         result['needprinting'] = needprinting
         result['resulttext'] = Markup(resulttext)
         result['action'] = action or {}
+        result['mailing_id'] = mailing.id
         return result
 
     def do_update_followup_level(self, to_update, partner_list, date):
+        # one write, hence one UPDATE, per follow-up level
+        partner_list = set(partner_list)
+        line_ids_per_level = defaultdict(list)
         for id in to_update.keys():
             if to_update[id]['partner_id'] in partner_list:
-                self.env['account.move.line'].browse([int(id)]).write(
-                    {'followup_line_id': to_update[id]['level'],
-                     'followup_date': date})
+                line_ids_per_level[to_update[id]['level']].append(int(id))
+        for level, line_ids in line_ids_per_level.items():
+            self.env['account.move.line'].browse(line_ids).write(
+                {'followup_line_id': level,
+                 'followup_date': date})
+        # the statistics are updated by the database
+        stats = self.env['followup.stat.by.partner']
+        stats._flush_depends()
+        stats.invalidate_model()
 
     def clear_manual_actions(self, partner_list):
         partner_list_ids = [partner.partner_id.id for partner in self.env[
@@ -114,11 +140,12 @@ class FollowupPrint(models.TransientModel):
              ('payment_responsible_id', '!=', False),
              ('payment_next_action_date', '!=', False)])
 
-        partners_to_clear = []
-        for part in ids:
-            if not part.unreconciled_aml_ids:
-                partners_to_clear.append(part.id)
-                part.action_done()
+        # partners still having unreconciled receivable items, in any company,
+        # have statistics
+        with_credits = self.env['followup.stat.by.partner'].sudo().search(
+            [('partner_id', 'in', ids.ids)]).partner_id
+        partners_to_clear = ids - with_credits
+        partners_to_clear.action_done()
         return len(partners_to_clear)
 
     def do_process(self):
@@ -145,7 +172,8 @@ class FollowupPrint(models.TransientModel):
             'om_account_followup.view_om_account_followup_sending_results')
         context.update({'description': restot['resulttext'],
                         'needprinting': restot['needprinting'],
-                        'report_data': restot['action']})
+                        'report_data': restot['action'],
+                        'mailing_id': restot['mailing_id']})
         return {
             'name': _('Send Letters and Emails: Actions Summary'),
             'view_type': 'form',
@@ -200,6 +228,8 @@ class FollowupPrint(models.TransientModel):
 
         partner_list = []
         to_update = {}
+        stat_ids = self.env['followup.stat.by.partner']._get_stat_ids(
+            {(line[0], company_id) for line in move_lines})
 
         for partner_id, followup_line_id, date_maturity, date, id in \
                 move_lines:
@@ -207,7 +237,9 @@ class FollowupPrint(models.TransientModel):
                 continue
             if followup_line_id not in fups:
                 continue
-            stat_line_id = partner_id * 10000 + company_id
+            stat_line_id = stat_ids.get((partner_id, company_id))
+            if not stat_line_id:
+                continue
             if date_maturity:
                 date_maturity = fields.Date.to_string(date_maturity)
                 if date_maturity <= fups[followup_line_id][0].strftime(
@@ -17,5 +17,9 @@ class FollowupSendingResults(models.TransientModel):
     def _get_need_printing(self):
         return self.env.context.get('needprinting')
 
+    def _get_mailing(self):
+        return self.env.context.get('mailing_id')
+
     description = fields.Html("Description", readonly=True, default=_get_description)
     needprinting = fields.Boolean("Needs Printing", default=_get_need_printing)
+    mailing_id = fields.Many2one('followup.mailing', "Emails", readonly=True, default=_get_mailing)